@@ -8,9 +8,12 @@ from future import standard_library
 # from abc import ABCMeta, abstractmethod
 from future.builtins import object
 
+from pyload.api.session import SESSIONS
 from pyload.core.datatype.base import DownloadState, DownloadStatus, Permission
 from pyload.core.datatype.user import User
 from pyload.utils.convert import to_str
+from pyload.utils.layer.legacy.collections import OrderedDict
+from pyload.utils.layer.safethreading import Lock
 
 # from future.utils import with_metaclass
 
@@ -61,6 +64,10 @@ class AbstractApi(object):
     def add_user(self, username, password):
         pass
 
+    # @abstractmethod
+    def backup_database(self, path):
+        pass
+
     # @abstractmethod
     def check_container(self, filename, data):
         pass
@@ -86,6 +93,10 @@ class AbstractApi(object):
     # def delete_config(self, plugin):
         # pass
 
+    # @abstractmethod
+    def create_session(self, username, password):
+        pass
+
     # @abstractmethod
     def delete_files(self, fids):
         pass
@@ -94,12 +105,16 @@ class AbstractApi(object):
     def delete_packages(self, pids):
         pass
 
+    # @abstractmethod
+    def end_session(self, token):
+        pass
+
     # @abstractmethod
     def find_files(self, pattern):
         pass
 
     # @abstractmethod
-    def find_packages(self, tags):
+    def find_packages(self, tags, match_all=True):
         pass
 
     # @abstractmethod
@@ -158,10 +173,18 @@ class AbstractApi(object):
     # def get_core_config(self):
         # pass
 
+    # @abstractmethod
+    def get_database_stats(self):
+        pass
+
     # @abstractmethod
     def get_file_info(self, fid):
         pass
 
+    # @abstractmethod
+    def get_file_page(self, limit, cursor, state):
+        pass
+
     # @abstractmethod
     def get_file_tree(self, pid, full):
         pass
@@ -194,10 +217,18 @@ class AbstractApi(object):
     def get_package_info(self, pid):
         pass
 
+    # @abstractmethod
+    def get_package_page(self, root, limit, cursor):
+        pass
+
     # @abstractmethod
     # def get_plugin_config(self):
         # pass
 
+    # @abstractmethod
+    def get_plugin_traffic(self, start, end, period):
+        pass
+
     # @abstractmethod
     def get_progress_info(self):
         pass
@@ -214,6 +245,14 @@ class AbstractApi(object):
     def get_status_info(self):
         pass
 
+    # @abstractmethod
+    def get_traffic(self, start, end, period, plugin):
+        pass
+
+    # @abstractmethod
+    def get_tree_delta(self, since):
+        pass
+
     # @abstractmethod
     def get_user_data(self):
         pass
@@ -431,10 +470,15 @@ class Api(AbstractApi):
     EXTERNAL = AbstractApi  # let the json api know which methods are external
     EXTEND = False  # only extendable when set too true
 
+    # max number of user contexts kept by `with_user_context`
+    USER_CACHE_SIZE = 100
+
     def __init__(self, core):
         self._ = core._
         self.pyload = core
-        self.user_apis = {}
+        # uid -> UserApi, least recently used first
+        self.user_apis = OrderedDict()
+        self.user_lock = Lock()
 
     @property
     def user(self):
@@ -478,15 +522,52 @@ class Api(AbstractApi):
         if isinstance(uid, User):
             uid = uid.uid
 
-        if uid not in self.user_apis:
-            user = self.pyload.db.get_user_data(uid=uid)
-            if not user:  # TODO: anonymous user?
-                return
-
-            self.user_apis[uid] = UserApi(
-                self.pyload, User.from_user_data(self, user))
-
-        return self.user_apis[uid]
+        with self.user_lock:
+            api = self.user_apis.pop(uid, None)
+            if api is not None:
+                self.user_apis[uid] = api
+                return api
+
+        user = self.pyload.db.get_user_data(uid=uid)
+        if not user:  # TODO: anonymous user?
+            return
+        return self._cache_user(user)
+
+    def _cache_user(self, user):
+        api = UserApi(self.pyload, User.from_user_data(self, user))
+        with self.user_lock:
+            self.user_apis.pop(user.uid, None)
+            self.user_apis[user.uid] = api
+            while len(self.user_apis) > self.USER_CACHE_SIZE:
+                self.user_apis.popitem(last=False)
+        return api
+
+    def init_user_contexts(self):
+        """Load the contexts of all users with one query and keep them in
+        sync with the user events, must be called once on startup."""
+        users = self.pyload.db.get_all_user_data()
+        for uid in sorted(users)[:self.USER_CACHE_SIZE]:
+            self._cache_user(users[uid])
+
+        self.pyload.evm.listen_to('user:updated', self._user_updated)
+        self.pyload.evm.listen_to('user:deleted', self._user_deleted)
+
+    def _user_updated(self, uid):
+        user = self.pyload.db.get_user_data(uid=uid)
+        if user is None:
+            self._user_deleted(uid)
+            return
+        SESSIONS.update(user)
+        with self.user_lock:
+            cached = uid in self.user_apis
+        # reloaded only when in use
+        if cached:
+            self._cache_user(user)
+
+    def _user_deleted(self, uid):
+        with self.user_lock:
+            self.user_apis.pop(uid, None)
+        SESSIONS.revoke(uid)
 
     #############################
     #  Auth+User Information
@@ -508,17 +589,48 @@ class Api(AbstractApi):
     def check_auth(self, username, password):
         """Check authentication and returns details.
 
+        A token of `createSession` is accepted as password, it is checked
+        without hashing.
+
         :param username:
         :param password:
         :param remoteip:
         :return: dict with info, empty when login is incorrect
 
         """
+        user = SESSIONS.get(password)
+        if user is not None and user.name == username:
+            return user
+
         self.pyload.log.info(
             self._("User '{0}' tries to log in").format(username))
 
         return self.pyload.db.check_auth(username, password)
 
+    @requireperm(Permission.All)
+    def create_session(self, username, password):
+        """Login once and get a token to use as password afterwards, so the
+        password is not hashed again on every request.
+
+        :param username:
+        :param password:
+        :return: session token, `None` when login is incorrect
+
+        """
+        user = self.check_auth(username, password)
+        if not user:
+            return
+        return SESSIONS.create(user)
+
+    @requireperm(Permission.All)
+    def end_session(self, token):
+        """Logout, the token can not be used anymore.
+
+        :param token: session token
+
+        """
+        SESSIONS.remove(token)
+
     @staticmethod
     def is_authorized(func, user):
         """Checks if the user is authorized for specific method.
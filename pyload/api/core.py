@@ -8,9 +8,11 @@ import os
 from future import standard_library
 
 from pyload.api.base import BaseApi, requireperm
-from pyload.core.datatype.base import Permission, StatusInfo
+from pyload.core.datatype.base import (Conflict, Permission, ProgressInfo,
+                                       ProgressType, StatusInfo)
 from pyload.core.datatype.task import Interaction
 from pyload.utils.fs import availspace
+from pyload.utils.layer.safethreading import Thread
 
 standard_library.install_aliases()
 
@@ -71,8 +73,15 @@ class CoreApi(BaseApi):
         :rtype: list of :class:`ProgressInfo`
 
         """
-        return (self.pyload.tsm.get_progress_list() +
+        info = (self.pyload.tsm.get_progress_list() +
                 self.pyload.iom.get_progress_list())
+        backup = self.pyload.db.backup_progress
+        if backup and (self.user is None or self.user.is_admin()):
+            target, done, total = backup
+            info.append(ProgressInfo(
+                'Database', os.path.basename(target), self._('backup'), 0,
+                done, total, None, ProgressType.FileOperation))
+        return info
 
     def pause_server(self):
         """Pause server: It won't start any new downloads, but nothing gets
@@ -138,6 +147,48 @@ class CoreApi(BaseApi):
         except Exception:
             return ['No log available']
 
+    def get_database_stats(self):
+        """Statistics of the database jobs, to tell waiting for the queue
+        apart from slow queries.
+
+        :return: dict with the current queue depth, reader connections and
+            per method counters, `wait` and `exec` latency histograms over
+            the `buckets` bounds in seconds
+
+        """
+        return self.pyload.db.get_stats()
+
+    def backup_database(self, path):
+        """Start copying the database to file `path` while downloads keep
+        running, the progress is reported by `getProgressInfo`.
+
+        :param path: target file, replaced when the backup is complete
+        :raises Conflict: if a backup is already running
+
+        """
+        path = os.path.abspath(path)
+        # reserved before the thread has started
+        if not self.pyload.db.reserve_backup(path):
+            raise Conflict
+
+        def backup():
+            try:
+                self.pyload.db.backup(path)
+            except Exception as exc:
+                self.pyload.log.error(
+                    self._('Database backup failed: {0}').format(exc))
+            else:
+                self.pyload.log.info(
+                    self._('Database saved to {0}').format(path))
+
+        thread = Thread(target=backup)
+        thread.daemon = True
+        try:
+            thread.start()
+        except Exception:
+            self.pyload.db.release_backup()
+            raise
+
     # @requireperm(Permission.All)
     # def is_time_download(self):
         # """
@@ -102,9 +102,9 @@ class DownloadApi(BaseApi):
         if hoster:
             self.pyload.iom.create_info_thread(hoster, pid)
 
-        self.pyload.log.info((self._(
-            'Added {0:d} links to package '
-            '#{0:d}').format(pid)).format(len(hoster + crypter)))
+        self.pyload.log.info(self._(
+            'Added {0:d} links to package #{1:d}').format(
+                len(hoster + crypter), pid))
         self.pyload.files.save()
 
     @requireperm(Permission.Add)
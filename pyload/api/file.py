@@ -63,6 +63,48 @@ class FileApi(BaseApi):
         """
         return self.pyload.files.get_tree(pid, full, state)
 
+    @requireperm(Permission.All)
+    def get_tree_delta(self, since):
+        """Packages and files changed since an earlier call, so clients do not
+        need to fetch the whole tree again.
+
+        :param since: `version` of the last delta, 0 for the first call
+        :return: :class:`TreeDelta`, with the whole tree and `full` set when
+            the changes since `since` are not known anymore
+
+        """
+        owner = self.user.true_primary if self.user else None
+        return self.pyload.files.get_tree_delta(since, owner)
+
+    @requireperm(Permission.All)
+    def get_file_page(self, limit, cursor=None, state=DownloadState.All):
+        """Retrieve the files of all packages of the user page by page,
+        ordered by package and position. Unlike `getAllFiles` the size of the
+        response is bounded by `limit`.
+
+        :param limit: maximal number of files on the page
+        :param cursor: cursor of the previous page, `None` for the first one
+        :param state: :class:`DownloadState`, the attributes used for filtering
+        :return: :class:`FilePage`, cursor is `None` after the last page
+
+        """
+        owner = self.user.true_primary if self.user else None
+        return self.pyload.files.get_file_page(limit, cursor, state, owner)
+
+    @requireperm(Permission.All)
+    def get_package_page(self, root, limit, cursor=None):
+        """Retrieve the child packages of a package page by page, ordered by
+        position.
+
+        :param root: package id
+        :param limit: maximal number of packages on the page
+        :param cursor: cursor of the previous page, `None` for the first one
+        :return: :class:`PackagePage`, cursor is `None` after the last page
+
+        """
+        owner = self.user.true_primary if self.user else None
+        return self.pyload.files.get_package_page(root, limit, cursor, owner)
+
     @requireperm(Permission.All)
     def get_package_content(self, pid):
         """Only retrieve content of a specific package.
@@ -110,7 +152,7 @@ class FileApi(BaseApi):
     @requireperm(Permission.All)
     def find_files(self, pattern):
         return self.pyload.files.get_tree(
-            -1, True, DownloadState.All, pattern)
+            -1, True, DownloadState.All, search=pattern)
 
     @requireperm(Permission.All)
     def search_suggestions(self, pattern):
@@ -119,8 +161,16 @@ class FileApi(BaseApi):
         return uniquify(names)
 
     @requireperm(Permission.All)
-    def find_packages(self, tags):
-        raise NotImplementedError
+    def find_packages(self, tags, match_all=True):
+        """Packages by their tags.
+
+        :param tags: list of tags
+        :param match_all: packages need all tags, otherwise any of them
+        :return: :class:`TreeCollection`
+
+        """
+        owner = self.user.true_primary if self.user else None
+        return self.pyload.files.find_packages(tags, owner, match_all)
 
     @requireperm(Permission.Modify)
     def update_package(self, pack):
@@ -218,8 +268,8 @@ class FileApi(BaseApi):
     @requireperm(Permission.Modify)
     def order_files(self, fids, pid, position):
         """Set a new position for a bunch of files within a package. All files
-        have to be in the same package and must be **continuous** in the
-        package. That means no gaps between them.
+        have to be in the same package, they will be placed continuous at
+        the new position.
 
         :param fids: list of file ids
         :param pid: package id of parent package
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, unicode_literals
+
+import binascii
+import os
+import time
+
+from future import standard_library
+from future.builtins import object
+
+from pyload.utils.layer.safethreading import Lock
+
+standard_library.install_aliases()
+
+
+class SessionCache(object):
+    """Tokens of logged in users, so the password is only hashed once per
+    session.
+
+    A token expires after `TTL` seconds without use and is revoked with
+    all others of its user when the password changes.
+
+    """
+    TTL = 30 * 60
+
+    def __init__(self, ttl=None):
+        if ttl is not None:
+            self.TTL = ttl
+        self.lock = Lock()
+        self.sessions = {}  # token -> [user, expires]
+        self.tokens = {}  # uid -> set of tokens
+
+    def create(self, user):
+        """New token for `UserData` `user`."""
+        token = binascii.hexlify(os.urandom(20)).decode('ascii')
+        now = time.time()
+        with self.lock:
+            self._expire(now)
+            self.sessions[token] = [user, now + self.TTL]
+            self.tokens.setdefault(user.uid, set()).add(token)
+        return token
+
+    def get(self, token):
+        """`UserData` of a valid token, `None` if unknown or expired."""
+        now = time.time()
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return
+            if session[1] < now:
+                self._remove(token)
+                return
+            session[1] = now + self.TTL
+            return session[0]
+
+    def remove(self, token):
+        with self.lock:
+            if token in self.sessions:
+                self._remove(token)
+
+    def update(self, user):
+        """Replaces the `UserData` of the sessions of its user."""
+        with self.lock:
+            for token in self.tokens.get(user.uid, ()):
+                self.sessions[token][0] = user
+
+    def revoke(self, uid):
+        """Ends all sessions of user `uid`."""
+        with self.lock:
+            for token in self.tokens.pop(uid, ()):
+                del self.sessions[token]
+
+    def _remove(self, token):
+        user = self.sessions.pop(token)[0]
+        tokens = self.tokens[user.uid]
+        tokens.discard(token)
+        if not tokens:
+            del self.tokens[user.uid]
+
+    def _expire(self, now):
+        for token in [token for token, (user, expires)
+                      in self.sessions.items() if expires < now]:
+            self._remove(token)
+
+
+# shared by the api and its user context proxies
+SESSIONS = SessionCache()
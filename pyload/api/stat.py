@@ -2,28 +2,93 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import time
+
 from future import standard_library
 
-from pyload.api.base import BaseApi
+from pyload.api.base import BaseApi, requireperm
+from pyload.core.database.stat import DAY, HOUR
+from pyload.core.datatype.base import Permission, PluginTraffic, TrafficInfo
 
 standard_library.install_aliases()
 
 
+# uid -> (time, quota)
 CACHE = {}
+# seconds a calculated quota is reused
+CACHE_TIME = 60
 QUOTA_UNLIMITED = -1
 
 
+def _user_uid(user):
+    # core has access to the statistics of all users
+    return user.true_primary if user else None
+
+
+def _primary_uid(pyload, uid):
+    # secondary users share the statistics and quota of their primary user
+    api = pyload.api.with_user_context(uid)
+    return api.user.true_primary if api else uid
+
+
 class StatisticsApi(BaseApi):
     """Retrieve download statistics and quota."""
 
     def record_download(self, file):
         """Add download record to the statistics."""
-        del CACHE[:]
-        raise NotImplementedError
+        premium = file.has_plugin() and file.plugin.premium
+        uid = _primary_uid(self.pyload, file.owner)
+        self.pyload.db.add_entry(uid, file.pluginname, premium, file.size)
+        CACHE.pop(uid, None)
 
     def calc_quota(self, uid):
-        return QUOTA_UNLIMITED
+        """Bytes left of the daily traffic limit of the user, the usage of
+        the last 24 hours is summed from the statistic buckets."""
+        if uid is None:
+            return QUOTA_UNLIMITED
+        uid = _primary_uid(self.pyload, uid)
+        now = time.time()
+        cached = CACHE.get(uid)
+        if cached is not None and cached[0] + CACHE_TIME > now:
+            return cached[1]
+
+        user = self.pyload.db.get_user_data(uid=uid)
+        if user is None or user.traffic < 0:
+            quota = QUOTA_UNLIMITED
+        else:
+            used = self.pyload.db.get_traffic_sum(uid, now - DAY, now)
+            quota = max(0, user.traffic - used)
+        CACHE[uid] = (now, quota)
+        return quota
 
     def get_quota(self):
         """Number of bytes the user has left for download."""
-        return self.calc_quota(self.user.true_primary)
+        return self.calc_quota(_user_uid(self.user))
+
+    @requireperm(Permission.All)
+    def get_traffic(self, start, end, period=HOUR, plugin=None):
+        """Downloaded bytes per time bucket.
+
+        :param start: begin of the range as timestamp
+        :param end: end of the range as timestamp, not included
+        :param period: width of the buckets in seconds, one of 60, 3600 and
+            86400; minutes are kept for 2 and hours for 90 days
+        :param plugin: only count downloads of this plugin
+        :return: list of :class:`TrafficInfo`, empty buckets are left out
+
+        """
+        return [TrafficInfo(*r) for r in self.pyload.db.get_traffic(
+            _user_uid(self.user), start, end, period, plugin)]
+
+    @requireperm(Permission.All)
+    def get_plugin_traffic(self, start, end, period=HOUR):
+        """Downloaded bytes per plugin and premium status in a range.
+
+        :param start: begin of the range as timestamp
+        :param end: end of the range as timestamp, not included
+        :param period: width of the buckets the range is aligned to
+        :return: list of :class:`PluginTraffic`
+
+        """
+        return [PluginTraffic(*r) for r in self.pyload.db.get_plugin_traffic(
+            _user_uid(self.user), start, end, period)]
@@ -5,6 +5,7 @@ from __future__ import absolute_import, unicode_literals
 from future import standard_library
 
 from pyload.api.base import BaseApi, requireperm
+from pyload.api.session import SESSIONS
 from pyload.core.datatype.base import Permission
 
 standard_library.install_aliases()
@@ -25,11 +26,20 @@ class UserApi(BaseApi):
         password!
 
         """
-        raise NotImplementedError
+        if (self.user and not self.user.is_admin() and
+                self.user.name != username):
+            return False
+        user = self.pyload.db.get_user_data(name=username)
+        if user is None or not self.pyload.db.change_password(
+                username, old_password, new_password):
+            return False
+        # sessions of the old password
+        SESSIONS.revoke(user.uid)
+        return True
 
     def get_all_user_data(self):
         """Retrieves :class:`UserData` of all exisitng users."""
-        raise NotImplementedError
+        return self.pyload.db.get_all_user_data()
 
     def add_user(self, username, password):
         """Adds an user to the db.
@@ -42,7 +52,8 @@ class UserApi(BaseApi):
 
     def update_user_data(self, data):
         """Change parameters of user account."""
-        raise NotImplementedError
+        self.pyload.db.update_user(data)
+        self.pyload.evm.fire('user:updated', data.uid)
 
     def remove_user(self, uid):
         """Removes user from the db.
@@ -50,4 +61,6 @@ class UserApi(BaseApi):
         :param uid: users uid.
 
         """
-        raise NotImplementedError
+        # secondary users are removed with their primary one
+        for removed in self.pyload.db.remove_user(uid):
+            self.pyload.evm.fire('user:deleted', removed)
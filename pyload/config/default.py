@@ -68,7 +68,9 @@ def _gen_config():
         ('niceness',
             (0, 'Process priority', None, range(-19, 20), InputType.Int)),
         ('ioniceness',
-            (0, 'Process I/O priority', None, range(0, 3), InputType.Int))
+            (0, 'Process I/O priority', None, range(0, 3), InputType.Int)),
+        ('cache_size',
+            (1000, 'Cached files and packages', None, None, InputType.Int))
     )
     log_config = (
         ('console',
@@ -173,6 +175,12 @@ def _gen_config():
         ('interval',
             (1, 'Check interval (in days)', None, None, InputType.Int))
     )
+    db_config = (
+        ('memory',
+            (False, 'Keep database in memory', None, None, InputType.Bool)),
+        ('snapshot_interval',
+            (5, 'Snapshot interval (in minutes)', None, None, InputType.Int))
+    )
 
     root_config = (
         ('general',
@@ -190,7 +198,9 @@ def _gen_config():
         ('proxy',
             (proxy_config, 'Proxy', None)),
         ('update',
-            (up_config, 'Updates', None))
+            (up_config, 'Updates', None)),
+        ('database',
+            (db_config, 'Database', None))
     )
     return root_config
 
@@ -99,6 +99,7 @@ class Core(object):
     def _init_api(self):
         from pyload.api import Api
         self.api = Api(self)
+        self.api.init_user_contexts()
 
     def _init_database(self, restore):
         from pyload.core.database import DatabaseBackend
@@ -106,7 +107,9 @@ class Core(object):
 
         # TODO: Move inside DatabaseBackend
         newdb = not os.path.isfile(DatabaseBackend.DB_FILE)
-        self.db = DatabaseBackend(self)
+        self.db = DatabaseBackend(
+            self, self.config.get('database', 'memory'),
+            self.config.get('database', 'snapshot_interval') * 60)
         self.db.setup()
 
         if restore or newdb:
@@ -256,6 +259,7 @@ class Core(object):
                 self.tsm.work()
                 self.iom.work()
                 self.exm.work()
+                self.files.work()
                 if self.__do_restart:
                     raise Restart
                 if self.__do_exit:
@@ -307,5 +311,6 @@ class Core(object):
             self.api.stop_all_downloads()
         finally:
             self.files.sync_save()
+            self.db.flush_storage()
             self.__running.clear()
             self.evm.fire('pyload:stopped')
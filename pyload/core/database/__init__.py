@@ -3,7 +3,7 @@
 
 from __future__ import absolute_import
 
-from pyload.core.database.backend import DatabaseBackend, DatabaseMethods, async, inner, queue
+from pyload.core.database.backend import DatabaseBackend, DatabaseMethods, async, bulk, inner, queue, read
 from pyload.core.database.account import AccountMethods
 from pyload.core.database.config import ConfigMethods
 from pyload.core.database.file import FileMethods
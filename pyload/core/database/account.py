@@ -4,7 +4,7 @@ from __future__ import absolute_import, unicode_literals
 
 from future import standard_library
 
-from pyload.core.database.backend import DatabaseMethods, async, queue
+from pyload.core.database.backend import DatabaseMethods, async, queue, read
 from pyload.core.datatype.base import AccountInfo
 
 standard_library.install_aliases()
@@ -12,7 +12,7 @@ standard_library.install_aliases()
 
 class AccountMethods(DatabaseMethods):
 
-    @queue
+    @read
     def load_accounts(self):
         self.c.execute(
             'SELECT aid, plugin, loginname, owner, activated, shared, '
@@ -3,17 +3,20 @@
 
 from __future__ import absolute_import, unicode_literals
 
-import io
+import bisect
 import os
 import shutil
-from queue import Queue
+import time
+from collections import deque
+from queue import Empty, LifoQueue
 
 from future import standard_library
 from future.builtins import int, object
 
+from pyload.core.database.backup import backup_file, copy_database
 from pyload.utils.convert import to_str
-from pyload.utils.fs import remove
-from pyload.utils.layer.safethreading import Event, Thread
+from pyload.utils.layer.safethreading import (Condition, Event, Lock, Thread,
+                                              Timer, local)
 
 standard_library.install_aliases()
 
@@ -24,7 +27,34 @@ except Exception:
     import sqlite3
 
 DB = None
-DB_VERSION = 7
+DB_VERSION = 13
+# version of the schema created by `DatabaseBackend._create_tables`
+DB_BASE_VERSION = 7
+
+# objects created or changed by the migrations, newest first, as version,
+# name and part of their sql; tells the version of databases that did not
+# store it in `user_version` yet
+SCHEMA_MARKS = (
+    (13, 'owner_stats', None),
+    (12, 'package_tags', None),
+    (11, 'file_url', None),
+    (10, 'stats', '"period"'),
+    (9, 'insert_file', 'new.fileorder < 0'),
+    (8, 'package_stats', None),
+    (DB_BASE_VERSION, 'files', None),
+)
+
+# counters of `owner_stats` computed from the files
+OWNER_STATS_QUERY = (
+    'SELECT owner, COUNT(fid), SUM(size), SUM(dlstatus NOT IN (5,6)), '
+    'SUM(CASE WHEN dlstatus NOT IN (5,6) THEN size ELSE 0 END), '
+    'SUM(dlstatus IN (2,3,8,9,10)), '
+    'SUM(CASE WHEN dlstatus IN (2,3,8,9,10) THEN size ELSE 0 END) '
+    'FROM files WHERE dlstatus > 0 GROUP BY owner')
+
+# distance between the sort keys of neighbouring files or packages, so an
+# item can be moved between two others without shifting the following ones
+ORDER_GAP = 1 << 16
 
 
 def set_db(db):
@@ -46,6 +76,13 @@ def async(f):
     return x
 
 
+def read(f):
+    def x(*args, **kwargs):
+        if DB:
+            return DB.read(f, *args, **kwargs)
+    return x
+
+
 def inner(f):
     def x(*args, **kwargs):
         if DB:
@@ -53,6 +90,12 @@ def inner(f):
     return x
 
 
+def bulk(f):
+    """Runs the job of a `@queue` or `@async` method in the bulk lane."""
+    f.lane = DatabaseBackend.BULK
+    return f
+
+
 class DatabaseMethods(object):
     # stubs for autocompletion
     core = None
@@ -65,6 +108,222 @@ class DatabaseMethods(object):
         DatabaseBackend.register_sub(cls)
 
 
+class Histogram(object):
+    """Latency histogram with fixed buckets."""
+
+    # upper bounds of the buckets in seconds, the last bucket is unbounded
+    BOUNDS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        return {'buckets': list(self.counts), 'total': self.total,
+                'max': self.max}
+
+
+class JobStats(object):
+    """Counters and latency histograms of the database methods, split in
+    the time waited for the queue or a connection and the execution time."""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.methods = {}
+        self.lanes = {}
+
+    def _add(self, stats, key, wait, duration, error):
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = {
+                'count': 0, 'errors': 0,
+                'wait': Histogram(), 'exec': Histogram()}
+        entry['count'] += 1
+        entry['errors'] += bool(error)
+        entry['wait'].add(wait)
+        entry['exec'].add(duration)
+
+    def record(self, name, wait, duration, error=False, lane=None):
+        """Record a call of method `name`, jobs of the queue also count for
+        their `lane`."""
+        with self.lock:
+            self._add(self.methods, name, wait, duration, error)
+            if lane is not None:
+                self._add(self.lanes, lane, wait, duration, error)
+
+    @staticmethod
+    def _to_dict(stats):
+        return dict(
+            (key, {'count': e['count'], 'errors': e['errors'],
+                   'wait': e['wait'].to_dict(),
+                   'exec': e['exec'].to_dict()})
+            for key, e in stats.items())
+
+    def to_dict(self):
+        with self.lock:
+            return {'methods': self._to_dict(self.methods),
+                    'lanes': self._to_dict(self.lanes)}
+
+    def reset(self):
+        with self.lock:
+            self.methods.clear()
+            self.lanes.clear()
+
+
+class JobQueue(object):
+    """Queue with lanes of decreasing priority, each lane is served in FIFO
+    order.
+
+    The head of a lower lane is served first once the lane was not served
+    for `max_wait` seconds or `max_skip` items of higher lanes were served
+    before it, so lower lanes can not starve.
+
+    """
+
+    def __init__(self, lanes, max_wait, max_skip):
+        self.lanes = [deque() for _ in range(lanes)]
+        self.skipped = [0] * lanes
+        self.served = [0.0] * lanes
+        self.max_wait = max_wait
+        self.max_skip = max_skip
+        self.cond = Condition()
+
+    def put(self, item, lane=0):
+        with self.cond:
+            self.lanes[lane].append((time.time(), item))
+            self.cond.notify()
+
+    def _pop(self):
+        now = time.time()
+        lane = next(i for i, q in enumerate(self.lanes) if q)
+        for low in range(len(self.lanes) - 1, lane, -1):
+            queue = self.lanes[low]
+            if not queue:
+                continue
+            waited = now - max(queue[0][0], self.served[low])
+            if waited >= self.max_wait or self.skipped[low] >= self.max_skip:
+                lane = low
+                break
+        for low in range(lane + 1, len(self.lanes)):
+            if self.lanes[low]:
+                self.skipped[low] += 1
+        self.skipped[lane] = 0
+        self.served[lane] = now
+        return self.lanes[lane].popleft()[1]
+
+    def get(self, timeout=None):
+        """Remove and return the next item, raises `Empty` after `timeout`
+        seconds without any."""
+        with self.cond:
+            if timeout is not None:
+                deadline = time.time() + timeout
+            while not any(self.lanes):
+                if timeout is None:
+                    self.cond.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Empty
+                self.cond.wait(remaining)
+            return self._pop()
+
+    def get_nowait(self):
+        return self.get(0)
+
+    def qsize(self, lane=None):
+        with self.cond:
+            if lane is None:
+                return sum(len(q) for q in self.lanes)
+            return len(self.lanes[lane])
+
+
+class StorageCache(object):
+    """Plugin storage of every identifier is loaded once on first access,
+    changes are written behind in batches after at most `DELAY` seconds."""
+
+    DELAY = 5
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = Lock()
+        self.data = {}  # identifier -> {key: value}
+        self.dirty = {}  # (identifier, key) -> value, None when deleted
+        self.timer = None
+
+    def _load(self, identifier):
+        data = self.data.get(identifier)
+        if data is None:
+            data = self.db.load_storage(identifier)
+            # pending changes of keys set before the first read
+            for (ident, key), value in self.dirty.items():
+                if ident != identifier:
+                    continue
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            self.data[identifier] = data
+        return data
+
+    def get(self, identifier, keys=None):
+        """Dict of all stored entries or of the given keys."""
+        with self.lock:
+            data = self._load(identifier)
+            if keys is None:
+                return dict(data)
+            return dict((key, data[key]) for key in keys if key in data)
+
+    def set(self, identifier, items):
+        """Sets the entries of dict `items`, keys with value None are
+        deleted."""
+        with self.lock:
+            data = self.data.get(identifier)
+            for key, value in items.items():
+                value = None if value is None else to_str(value)
+                self.dirty[(identifier, key)] = value
+                if data is None:
+                    continue
+                if value is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = value
+            self._schedule()
+
+    def delete(self, identifier, keys):
+        self.set(identifier, dict((key, None) for key in keys))
+
+    def _schedule(self):
+        if self.timer is not None:
+            return
+        self.timer = Timer(self.DELAY, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        """Write all pending changes to the database."""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            dirty, self.dirty = self.dirty, {}
+            if not dirty:
+                return
+            updates = [(ident, key, value)
+                       for (ident, key), value in dirty.items()
+                       if value is not None]
+            deletes = [(ident, key)
+                       for (ident, key), value in dirty.items()
+                       if value is None]
+            # enqueued under the lock, batches are written in order
+            self.db.write_storage(updates, deletes)
+
+
 class DatabaseJob(object):
 
     def __init__(self, func, *args, **kwargs):
@@ -76,44 +335,90 @@ class DatabaseJob(object):
 
         self.result = None
         self.exception = False
+        self.lane = getattr(func, 'lane', DatabaseBackend.DEFAULT)
+        # position in its lane, set when enqueued
+        self.seq = None
 
-        # import inspect
-        # self.frame = inspect.currentframe()
+        # timestamps of enqueueing, start and end of the execution
+        self.queued = time.time()
+        self.started = self.finished = None
 
     def __repr__(self):
-        # frame = self.frame.f_back
-        output = ''
-        # for i in range(5):
-        # output += "\t{0}:{1}, {2}\n".format(
-        # os.path.basename(
-        # frame.f_code.co_filename), frame.f_lineno, frame.f_code.co_name)
-        # frame = frame.f_back
-        # del frame
-        # del self.frame
-        return 'DataBase Job {0}:{1}{2}{3}Result: {4}'.format(
-            self.func.__name__, self.args[1:], os.linesep, output, self.result)
+        return 'DataBase Job {0}:{1}{2}Result: {3}'.format(
+            self.func.__name__, self.args[1:], os.linesep, self.result)
 
     def process_job(self):
+        self.started = time.time()
         try:
             self.result = self.func(*self.args, **self.kwgs)
         except Exception as exc:
-            self.pyload.log.error(exc, exc_info=self.pyload.debug)
+            # first argument is always the backend
+            pyload = self.args[0].pyload
+            pyload.log.error(exc, exc_info=pyload.debug)
             self.exception = exc
         finally:
+            self.finished = time.time()
             self.done.set()
 
     def wait(self):
         self.done.wait()
 
 
+def _backup_job(db, target, progress):
+    def step(done, total):
+        progress(done, total)
+        # instead of pausing, the jobs queued meanwhile run between the steps
+        db._process_pending()
+
+    try:
+        db.conn.commit()
+        copy_database(db.conn, target, pause=0, progress=step)
+    except Exception as exc:
+        return exc
+
+
 class DatabaseBackend(Thread):
 
     subs = []
 
     DB_FILE = 'pyload.db'
-    VERSION_FILE = 'db.version'
 
-    def __init__(self, core):
+    # max number of read-only connections used by `@read` methods
+    READERS = 4
+
+    # group commit budget: pending jobs are committed in one transaction
+    # after at most `COMMIT_DELAY` seconds or `COMMIT_SIZE` jobs
+    COMMIT_DELAY = 0.05
+    COMMIT_SIZE = 500
+
+    # lanes of the job queue, by priority: the default lane keeps the order
+    # of `@queue` and `@async` jobs, `@bulk` jobs run in between them
+    DEFAULT = 0
+    BULK = 1
+    LANES = ('default', 'bulk')
+    # a bulk job runs at the latest after waiting `BULK_MAX_WAIT` seconds or
+    # after `BULK_MAX_SKIP` jobs of the default lane
+    BULK_MAX_WAIT = 1.0
+    BULK_MAX_SKIP = 100
+
+    # jobs running longer than `SLOW_JOB` seconds are logged
+    SLOW_JOB = 0.5
+
+    # maintenance runs at most every `MAINTENANCE_INTERVAL` seconds, once the
+    # queue was idle for `MAINTENANCE_IDLE` seconds
+    MAINTENANCE_INTERVAL = 6 * 60 * 60
+    MAINTENANCE_IDLE = 60
+    # the counters maintained by triggers are checked every
+    # `RECONCILE_INTERVAL` seconds, also when the queue is never idle
+    RECONCILE_INTERVAL = 60 * 60
+    # pages freed per maintenance run
+    VACUUM_PAGES = 2000
+
+    # in memory mode the database is written to `DB_FILE` every
+    # `SNAPSHOT_INTERVAL` seconds and on exit
+    SNAPSHOT_INTERVAL = 5 * 60
+
+    def __init__(self, core, memory=False, snapshot_interval=None):
         super(DatabaseBackend, self).__init__()
         self.setDaemon(True)
         self.pyload = core
@@ -122,7 +427,39 @@ class DatabaseBackend(Thread):
         self.error = None  # TODO: Recheck...
         self.__running = Event()
 
-        self.jobs = Queue()
+        self.jobs = JobQueue(
+            len(self.LANES), self.BULK_MAX_WAIT, self.BULK_MAX_SKIP)
+
+        # connection and cursor are bound per thread, the backend thread
+        # holds the writer, `@read` callers borrow one from the pool
+        self.__local = local()
+        self.readers = LifoQueue()
+        self.__readers = 0
+        self.__wal = False
+        # whether the fts5 index of file names is available
+        self.fts = False
+
+        # run on an in-memory database, `DB_FILE` only holds snapshots
+        self.memory = memory
+        if snapshot_interval is not None:
+            self.SNAPSHOT_INTERVAL = snapshot_interval
+
+        # (target, copied pages, total pages) of the running backup
+        self.backup_progress = None
+        self.__backup = Lock()
+        self.__reserve = Lock()
+
+        # number of enqueued, processed and committed jobs per lane
+        self.__synced = Condition()
+        self.__enqueued = [0] * len(self.LANES)
+        self.__processed = [0] * len(self.LANES)
+        self.__committed = [0] * len(self.LANES)
+        self.__waiting = 0
+
+        self.stats = JobStats()
+
+        # plugin storage, written behind
+        self.storage = StorageCache(self)
 
         set_db(self)
 
@@ -130,6 +467,22 @@ class DatabaseBackend(Thread):
     def running(self):
         return self.__running.is_set()
 
+    @property
+    def conn(self):
+        return self.__local.conn
+
+    @conn.setter
+    def conn(self, value):
+        self.__local.conn = value
+
+    @property
+    def c(self):
+        return self.__local.c
+
+    @c.setter
+    def c(self, value):
+        self.__local.c = value
+
     def setup(self):
         """
         *MUST* be called before db can be used !.
@@ -137,38 +490,59 @@ class DatabaseBackend(Thread):
         self.start()
         self.__running.wait()
 
+    def _connect(self):
+        if self.memory:
+            # not shared, `@read` methods fall back to the job queue
+            return sqlite3.connect(':memory:', check_same_thread=False)
+        conn = sqlite3.connect(self.DB_FILE, check_same_thread=False)
+        os.chmod(self.DB_FILE, 0o600)
+        return conn
+
     def init(self):
         """Main loop, which executes commands."""
-        version = self._check_version()
-
-        self.conn = sqlite3.connect(self.DB_FILE)
-        os.chmod(self.DB_FILE, '0o600')
+        if self.memory and not hasattr(sqlite3.Connection, 'backup'):
+            self.pyload.log.warning(
+                self._('In-memory database needs the sqlite backup api, '
+                       'using the database file'))
+            self.memory = False
 
+        self.conn = self._connect()
         self.c = self.conn.cursor()
 
-        if version is not None and version < DB_VERSION:
-            success = self._convert_db(version)
+        if self.memory:
+            self._load_snapshot()
+
+        version = self._check_version()
+        if version is None:
+            version = self._create_db()
 
+        if version < DB_VERSION and not self._convert_db(version):
             # delete database
-            if not success:
-                self.c.close()
-                self.conn.close()
+            self.c.close()
+            self.conn.close()
 
-                remove(self.VERSION_FILE)
+            if os.path.isfile(self.DB_FILE):
                 shutil.move(self.DB_FILE, self.DB_FILE + '.bak')
-                self.pyload.log.warning(
-                    self._('Database was deleted due to incompatible version'))
+            self.pyload.log.warning(
+                self._('Database was deleted due to incompatible version'))
 
-                with io.open(self.VERSION_FILE, mode='wb') as fp:
-                    fp.write(to_str(DB_VERSION))
+            self.conn = self._connect()
+            self.c = self.conn.cursor()
+            self._convert_db(self._create_db())
 
-                self.conn = sqlite3.connect(self.DB_FILE)
-                os.chmod(self.DB_FILE, '0o600')
-                self.c = self.conn.cursor()
+        # readers only run concurrently to the writer in WAL mode
+        self.c.execute('PRAGMA journal_mode=WAL')
+        self.__wal = self.c.fetchone()[0] == 'wal'
+        self.c.execute('PRAGMA synchronous=NORMAL')
 
-        self._create_tables()
+        # depends on the sqlite build, not on the schema version
+        self._create_fts()
         self.conn.commit()
 
+        if self.memory:
+            # the file holds the migrated schema from the start
+            self._snapshot()
+
     def run(self):
         try:
             self.init()
@@ -177,48 +551,584 @@ class DatabaseBackend(Thread):
         finally:
             self.__running.set()
 
+        pending = 0
+        deadline = None
+        maintain = time.time() + self.MAINTENANCE_INTERVAL
+        reconcile = time.time() + self.RECONCILE_INTERVAL
+        snapshot = time.time() + self.SNAPSHOT_INTERVAL
         while True:
-            j = self.jobs.get()
+            if time.time() >= reconcile:
+                # queued in the bulk lane, it runs within `BULK_MAX_WAIT`
+                # even when the default lane stays busy
+                self.reconcile_owner_stats()
+                reconcile = time.time() + self.RECONCILE_INTERVAL
+            if self.memory and time.time() >= snapshot:
+                if pending:
+                    self._sync()
+                    pending = 0
+                self._snapshot()
+                snapshot = time.time() + self.SNAPSHOT_INTERVAL
+            try:
+                if pending:
+                    timeout = deadline
+                elif self.memory:
+                    timeout = min(maintain, reconcile, snapshot)
+                else:
+                    timeout = min(maintain, reconcile)
+                j = self.jobs.get(timeout=max(0, timeout - time.time()))
+            except Empty:
+                if pending:
+                    # budget exceeded while idle
+                    self._sync()
+                    pending = 0
+                elif time.time() >= maintain:
+                    self._maintain()
+                    maintain = time.time() + self.MAINTENANCE_INTERVAL
+                continue
+            if j == 'sync':
+                if pending:
+                    self._sync()
+                    pending = 0
+                continue
             if j == 'quit':
+                # bulk jobs may still be queued
+                while True:
+                    try:
+                        j = self.jobs.get_nowait()
+                    except Empty:
+                        break
+                    if j not in ('sync', 'quit'):
+                        self._process(j)
                 self.c.close()
-                self.conn.commit()
+                self._sync()
+                if self.memory:
+                    self._snapshot()
                 self.conn.close()
+                self._close_readers()
                 self.closing.set()
                 break
-            j.process_job()
+            self._process(j)
+            # maintenance waits until the queue has been idle for a while
+            maintain = max(maintain, time.time() + self.MAINTENANCE_IDLE)
+            if not pending:
+                deadline = time.time() + self.COMMIT_DELAY
+            pending += 1
+            # readers are waiting for the results or budget is exhausted
+            if (self.__waiting or pending >= self.COMMIT_SIZE or
+                    time.time() >= deadline):
+                self._sync()
+                pending = 0
+
+    def _process(self, job):
+        job.process_job()
+        self._record(job.func.__name__, job.started - job.queued,
+                     job.finished - job.started, job.exception,
+                     self.LANES[job.lane])
+        with self.__synced:
+            self.__processed[job.lane] += 1
+
+    def _process_pending(self):
+        """Runs and commits the jobs queued so far, called by long running
+        jobs of the backend thread between their steps."""
+        processed = 0
+        while processed < self.COMMIT_SIZE:
+            try:
+                j = self.jobs.get_nowait()
+            except Empty:
+                break
+            if j == 'quit':
+                # left to the main loop
+                self.jobs.put(j)
+                break
+            if j != 'sync':
+                self._process(j)
+                processed += 1
+        if processed:
+            self._sync()
+
+    def _record(self, name, wait, duration, error=False, lane=None):
+        self.stats.record(name, wait, duration, error, lane)
+        if duration > self.SLOW_JOB:
+            self.pyload.log.warning(
+                self._('Slow database job {0}: {1:.3f}s, '
+                       'waited {2:.3f}s').format(name, duration, wait))
+
+    def get_stats(self):
+        """Counters and latencies per method with the current queue depth
+        and connection usage."""
+        stats = self.stats.to_dict()
+        for lane, name in enumerate(self.LANES):
+            stats['lanes'].setdefault(name, {})['queue'] = self.jobs.qsize(
+                lane)
+        stats.update({
+            'queue': self.jobs.qsize(),
+            'readers': self.__readers,
+            'idle_readers': self.readers.qsize(),
+            'waiting': self.__waiting,
+            'buckets': list(Histogram.BOUNDS),
+        })
+        return stats
+
+    def _maintain(self):
+        """Housekeeping that used to block the startup, split into small
+        steps so it can run whenever the queue is idle."""
+        try:
+            # returns rows when pages were freed
+            self.c.execute(
+                'PRAGMA incremental_vacuum({0:d})'.format(self.VACUUM_PAGES))
+            self.c.fetchall()
+            # sample instead of scanning the whole tables
+            self.c.execute('PRAGMA analysis_limit=1000')
+            self.c.execute('ANALYZE')
+            self.c.execute('PRAGMA optimize')
+            if self.fts:
+                self.c.execute(
+                    "INSERT INTO files_fts(files_fts, rank) "
+                    "VALUES ('merge', 500)")
+            self.conn.commit()
+            # queued behind, expired statistic buckets
+            self.purge_stats()
+        except Exception as exc:
+            self.pyload.log.warning(
+                self._('Database maintenance failed: {0}').format(exc))
+            self.conn.rollback()
+
+    def _load_snapshot(self):
+        """Copy `DB_FILE` into the in-memory database."""
+        if not os.path.isfile(self.DB_FILE):
+            return
+        source = sqlite3.connect(self.DB_FILE)
+        try:
+            source.backup(self.conn)
+        finally:
+            source.close()
+
+    def _snapshot(self):
+        """Write the in-memory database to `DB_FILE` with the online backup
+        api, the target is replaced in a single transaction."""
+        started = time.time()
+        error = True
+        try:
+            target = sqlite3.connect(self.DB_FILE)
+            os.chmod(self.DB_FILE, 0o600)
+            try:
+                self.conn.backup(target)
+            finally:
+                target.close()
+            error = False
+        except Exception as exc:
+            self.pyload.log.error(
+                self._('Database snapshot failed: {0}').format(exc))
+        finally:
+            self._record('snapshot', 0, time.time() - started, error)
+
+    def reserve_backup(self, target):
+        """Marks a backup to `target` as running before it starts, returns
+        `False` when one already is."""
+        with self.__reserve:
+            if self.backup_progress is not None:
+                return False
+            self.backup_progress = (target, 0, 0)
+            return True
+
+    def release_backup(self):
+        """Ends the reservation of `reserve_backup`."""
+        with self.__reserve:
+            self.backup_progress = None
+
+    def backup(self, target, progress=None):
+        """Copy the database to file `target` while the core keeps running,
+        page by page. `progress` is called with the number of copied and
+        total pages after each step.
+
+        The backup has to be reserved with `reserve_backup` first, the
+        reservation is released when it ends.
+
+        """
+        def step(done, total):
+            self.backup_progress = (target, done, total)
+            if progress is not None:
+                progress(done, total)
+
+        with self.__backup:
+            try:
+                if self.__wal:
+                    # own read connection, jobs are processed meanwhile
+                    backup_file(self.DB_FILE, target, progress=step)
+                    return
+                # only the writer connection has the in-memory database,
+                # queued jobs run between the steps
+                exc = self.queue(_backup_job, target, step)
+                if exc is not None:
+                    raise exc
+            finally:
+                self.release_backup()
+
+    def _sync(self):
+        try:
+            self.conn.commit()
+        except Exception as exc:
+            self.pyload.log.error(exc, exc_info=self.pyload.debug)
+        with self.__synced:
+            self.__committed = list(self.__processed)
+            self.__synced.notify_all()
 
     # TODO: Recheck...
     def exit(self):
+        # the timer of the write behind would run after the queue is closed
+        self.storage.flush()
         self.__running.clear()
         self.closing = Event()
         self.jobs.put('quit')
         self.closing.wait(1)
 
     def _check_version(self):
-        """Get db version."""
-        if not os.path.isfile(self.VERSION_FILE) or not os.path.getsize(
-                self.VERSION_FILE):
-            with io.open(self.VERSION_FILE, mode='w') as fp:
-                fp.write(to_str(DB_VERSION))
-        with io.open(self.VERSION_FILE, mode='r') as fp:
-            v = int(fp.read().strip())
-        return v
+        """Get db version, `None` for a new database."""
+        self.c.execute('PRAGMA user_version')
+        version = self.c.fetchone()[0]
+        if version:
+            return version
+
+        # not stored by older databases, their schema tells the version
+        self.c.execute('SELECT name, sql FROM sqlite_master')
+        schema = dict(self.c.fetchall())
+        if not schema:
+            return None
+        for version, name, part in SCHEMA_MARKS:
+            if name in schema and (part is None or part in schema[name]):
+                self._set_version(version)
+                self.conn.commit()
+                return version
+        # no migration exists
+        return 0
+
+    def _set_version(self, version):
+        # part of the transaction of the schema changes
+        self.c.execute('PRAGMA user_version={0:d}'.format(version))
+
+    def _create_db(self):
+        """Create the tables of a new database, returns its version."""
+        # has to be set before the first table is created
+        self.c.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        self._create_tables()
+        self._set_version(DB_BASE_VERSION)
+        self.conn.commit()
+        return DB_BASE_VERSION
 
     def _convert_db(self, v):
-        try:
-            return getattr(self, '_convertV{0:d}'.format(v))()
-        except Exception:
+        """Migrate the database from version `v` step by step, returns
+        `False` when no migration exists for one of the versions."""
+        if not all(hasattr(self, '_convert_v{0:d}'.format(i))
+                   for i in range(v, DB_VERSION)):
             return False
+        for i in range(v, DB_VERSION):
+            self.pyload.log.info(
+                self._('Converting database to version {0:d}').format(i + 1))
+            getattr(self, '_convert_v{0:d}'.format(i))()
+            self._set_version(i + 1)
+            self.conn.commit()
+        return True
 
     # -- convert scripts start --
 
-    def _convert_v6(self):
-        return False
+    def _convert_v7(self):
+        """Sparse order keys, materialized package stats and the indexes of
+        the job and order queries."""
+        # auto_vacuum of an existing database only changes with a full
+        # VACUUM, needed once so the maintenance can free pages
+        self.c.execute('PRAGMA auto_vacuum')
+        if self.c.fetchone()[0] != 2:
+            self.conn.commit()
+            self.c.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self.c.execute('VACUUM')
+
+        # continuous keys keep their order when spread, so running this
+        # again after an interruption is harmless
+        self.c.execute(
+            'UPDATE packages SET packageorder = packageorder * ?',
+            (ORDER_GAP,))
+        self.c.execute(
+            'UPDATE files SET fileorder = fileorder * ?', (ORDER_GAP,))
+
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_package"')
+        self.c.execute(
+            'CREATE TRIGGER "insert_package" '
+            'AFTER INSERT ON "packages"'
+            'BEGIN '
+            'UPDATE packages SET added = strftime("%s", "now"), '
+            'packageorder = coalesce((SELECT max(p.packageorder) FROM '
+            'packages p WHERE p.root=new.root AND p.pid != new.pid), '
+            '-{0:d}) + {0:d} '
+            'WHERE rowid = new.rowid;'
+            'END'.format(ORDER_GAP))
+
+        self.c.execute('DROP TRIGGER IF EXISTS "delete_package"')
+        self.c.execute(
+            'CREATE TRIGGER "delete_package" '
+            'AFTER DELETE ON "packages"'
+            'BEGIN '
+            'DELETE FROM files WHERE package = old.pid;'
+            'DELETE FROM package_stats WHERE pid = old.pid;'
+            'END')
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_file"')
+        self.c.execute(
+            'CREATE TRIGGER "insert_file" '
+            'AFTER INSERT ON "files"'
+            'BEGIN '
+            'UPDATE files SET added = strftime("%s", "now"), '
+            'fileorder = coalesce((SELECT max(f.fileorder) FROM files f '
+            'WHERE f.package=new.package AND f.fid != new.fid), '
+            '-{0:d}) + {0:d} '
+            'WHERE rowid = new.rowid;'
+            'END'.format(ORDER_GAP))
+
+        self.c.execute(
+            'CREATE INDEX IF NOT EXISTS "package_order" ON '
+            'packages(root, packageorder)')
+        self.c.execute(
+            'CREATE INDEX IF NOT EXISTS "file_jobs" ON '
+            'files(dlstatus, plugin, package, fileorder)')
+
+        self.c.execute(
+            'CREATE INDEX IF NOT EXISTS "file_order" ON '
+            'files(package, fileorder)')
+
+        # stats of files with dlstatus != NA, maintained by triggers
+        # done means dlstatus in (finished, skipped)
+        self.c.execute(
+            'CREATE TABLE IF NOT EXISTS "package_stats" ('
+            '"pid" INTEGER PRIMARY KEY, '
+            '"linkstotal" INTEGER DEFAULT 0 NOT NULL, '
+            '"linksdone" INTEGER DEFAULT 0 NOT NULL, '
+            '"sizetotal" INTEGER DEFAULT 0 NOT NULL, '
+            '"sizedone" INTEGER DEFAULT 0 NOT NULL, '
+            'FOREIGN KEY(pid) REFERENCES packages(pid)'
+            ')'
+        )
+
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "insert_file_stats" '
+            'AFTER INSERT ON "files" WHEN new.dlstatus > 0 '
+            'BEGIN '
+            'INSERT OR IGNORE INTO package_stats(pid) VALUES (new.package);'
+            'UPDATE package_stats SET linkstotal = linkstotal + 1, '
+            'linksdone = linksdone + (new.dlstatus IN (5,6)), '
+            'sizetotal = sizetotal + new.size, '
+            'sizedone = sizedone + '
+            '(CASE WHEN new.dlstatus IN (5,6) THEN new.size ELSE 0 END) '
+            'WHERE pid = new.package;'
+            'END')
+
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "delete_file_stats" '
+            'AFTER DELETE ON "files" WHEN old.dlstatus > 0 '
+            'BEGIN '
+            'UPDATE package_stats SET linkstotal = linkstotal - 1, '
+            'linksdone = linksdone - (old.dlstatus IN (5,6)), '
+            'sizetotal = sizetotal - old.size, '
+            'sizedone = sizedone - '
+            '(CASE WHEN old.dlstatus IN (5,6) THEN old.size ELSE 0 END) '
+            'WHERE pid = old.package;'
+            'END')
+
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "update_file_stats" '
+            'AFTER UPDATE OF size, dlstatus, package ON "files" '
+            'WHEN old.size != new.size OR old.dlstatus != new.dlstatus '
+            'OR old.package != new.package '
+            'BEGIN '
+            'UPDATE package_stats SET linkstotal = linkstotal - 1, '
+            'linksdone = linksdone - (old.dlstatus IN (5,6)), '
+            'sizetotal = sizetotal - old.size, '
+            'sizedone = sizedone - '
+            '(CASE WHEN old.dlstatus IN (5,6) THEN old.size ELSE 0 END) '
+            'WHERE pid = old.package AND old.dlstatus > 0;'
+            'INSERT OR IGNORE INTO package_stats(pid) '
+            'SELECT new.package WHERE new.dlstatus > 0;'
+            'UPDATE package_stats SET linkstotal = linkstotal + 1, '
+            'linksdone = linksdone + (new.dlstatus IN (5,6)), '
+            'sizetotal = sizetotal + new.size, '
+            'sizedone = sizedone + '
+            '(CASE WHEN new.dlstatus IN (5,6) THEN new.size ELSE 0 END) '
+            'WHERE pid = new.package AND new.dlstatus > 0;'
+            'END')
+
+        # fill the stats of databases created before the table existed
+        self.c.execute('SELECT 1 FROM package_stats LIMIT 1')
+        if self.c.fetchone() is None:
+            self.c.execute(
+                'INSERT INTO package_stats(pid, linkstotal, linksdone, '
+                'sizetotal, sizedone) SELECT package, COUNT(fid), '
+                'SUM(dlstatus IN (5,6)), SUM(size), '
+                'SUM(CASE WHEN dlstatus IN (5,6) THEN size ELSE 0 END) '
+                'FROM files WHERE dlstatus > 0 GROUP BY package')
+
+    def _convert_v8(self):
+        """Files inserted with an order come from the bulk insert, which
+        sets their added time and updates the stats and the search index for
+        the whole batch."""
+        # recreated by `_create_fts`
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_file_fts"')
+
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_file_stats"')
+        self.c.execute(
+            'CREATE TRIGGER "insert_file_stats" '
+            'AFTER INSERT ON "files" '
+            'WHEN new.dlstatus > 0 AND new.fileorder < 0 '
+            'BEGIN '
+            'INSERT OR IGNORE INTO package_stats(pid) VALUES (new.package);'
+            'UPDATE package_stats SET linkstotal = linkstotal + 1, '
+            'linksdone = linksdone + (new.dlstatus IN (5,6)), '
+            'sizetotal = sizetotal + new.size, '
+            'sizedone = sizedone + '
+            '(CASE WHEN new.dlstatus IN (5,6) THEN new.size ELSE 0 END) '
+            'WHERE pid = new.package;'
+            'END')
+
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_file"')
+        self.c.execute(
+            'CREATE TRIGGER "insert_file" '
+            'AFTER INSERT ON "files" WHEN new.fileorder < 0 '
+            'BEGIN '
+            'UPDATE files SET added = strftime("%s", "now"), '
+            'fileorder = coalesce((SELECT max(f.fileorder) FROM files f '
+            'WHERE f.package=new.package AND f.fid != new.fid), '
+            '-{0:d}) + {0:d} '
+            'WHERE rowid = new.rowid;'
+            'END'.format(ORDER_GAP))
+
+    def _convert_v9(self):
+        """Download statistics are kept as buckets per minute, hour and day
+        instead of one row per entry, the old table was never written."""
+        self.c.execute('DROP INDEX IF EXISTS "stats_time"')
+        self.c.execute('DROP TABLE IF EXISTS "stats"')
+        self.c.execute(
+            'CREATE TABLE "stats" ('
+            '"user" INTEGER NOT NULL, '
+            '"plugin" TEXT NOT NULL, '
+            '"premium" INTEGER DEFAULT 0 NOT NULL, '
+            '"period" INTEGER NOT NULL, '
+            '"time" INTEGER NOT NULL, '
+            '"amount" INTEGER DEFAULT 0 NOT NULL, '
+            '"files" INTEGER DEFAULT 0 NOT NULL, '
+            'PRIMARY KEY(user, period, time, plugin, premium), '
+            'FOREIGN KEY(user) REFERENCES users(uid)'
+            ') WITHOUT ROWID'
+        )
+        self.c.execute(
+            'CREATE INDEX "stats_time" ON stats(period, time)')
+
+    def _convert_v10(self):
+        """Online check results are matched by url."""
+        self.c.execute(
+            'CREATE INDEX IF NOT EXISTS "file_url" ON files(url)')
+
+    def _convert_v11(self):
+        """Package tags are indexed in their own table, the tags column is
+        kept for reading whole packages."""
+        self.c.execute(
+            'CREATE TABLE IF NOT EXISTS "package_tags" ('
+            '"pid" INTEGER NOT NULL, '
+            '"tag" TEXT NOT NULL, '
+            'PRIMARY KEY(tag, pid), '
+            'FOREIGN KEY(pid) REFERENCES packages(pid)'
+            ') WITHOUT ROWID'
+        )
+        self.c.execute(
+            'CREATE INDEX IF NOT EXISTS "package_tags_pid" '
+            'ON package_tags(pid)')
+        self.c.execute('SELECT pid, tags FROM packages WHERE tags != ""')
+        self.c.executemany(
+            'INSERT OR IGNORE INTO package_tags(pid, tag) VALUES (?, ?)',
+            [(pid, tag.strip()) for pid, tags in self.c.fetchall()
+             for tag in tags.split(',') if tag.strip()])
+
+        self.c.execute('DROP TRIGGER IF EXISTS "delete_package"')
+        self.c.execute(
+            'CREATE TRIGGER "delete_package" '
+            'AFTER DELETE ON "packages"'
+            'BEGIN '
+            'DELETE FROM files WHERE package = old.pid;'
+            'DELETE FROM package_stats WHERE pid = old.pid;'
+            'DELETE FROM package_tags WHERE pid = old.pid;'
+            'END')
+
+    def _convert_v12(self):
+        """Download and queue counters per owner, maintained by triggers
+        like the package stats, so the status does not count the files."""
+        # queued means dlstatus not in (finished, skipped), processed means
+        # dlstatus in (online, queued, starting, waiting, downloading)
+        self.c.execute(
+            'CREATE TABLE IF NOT EXISTS "owner_stats" ('
+            '"owner" INTEGER PRIMARY KEY, '
+            '"linkstotal" INTEGER DEFAULT 0 NOT NULL, '
+            '"sizetotal" INTEGER DEFAULT 0 NOT NULL, '
+            '"linksqueued" INTEGER DEFAULT 0 NOT NULL, '
+            '"sizequeued" INTEGER DEFAULT 0 NOT NULL, '
+            '"linksprocess" INTEGER DEFAULT 0 NOT NULL, '
+            '"sizeprocess" INTEGER DEFAULT 0 NOT NULL'
+            ')'
+        )
+
+        # adds or removes the file `{row}` from the counters of its owner
+        update = (
+            'UPDATE owner_stats SET linkstotal = linkstotal {op} 1, '
+            'sizetotal = sizetotal {op} {row}.size, '
+            'linksqueued = linksqueued {op} ({row}.dlstatus NOT IN (5,6)), '
+            'sizequeued = sizequeued {op} (CASE WHEN {row}.dlstatus '
+            'NOT IN (5,6) THEN {row}.size ELSE 0 END), '
+            'linksprocess = linksprocess {op} '
+            '({row}.dlstatus IN (2,3,8,9,10)), '
+            'sizeprocess = sizeprocess {op} (CASE WHEN {row}.dlstatus '
+            'IN (2,3,8,9,10) THEN {row}.size ELSE 0 END) '
+            'WHERE owner = {row}.owner')
+
+        # rows of the bulk insert are counted by `add_links`
+        self.c.execute('DROP TRIGGER IF EXISTS "insert_file_owner_stats"')
+        self.c.execute(
+            'CREATE TRIGGER "insert_file_owner_stats" '
+            'AFTER INSERT ON "files" '
+            'WHEN new.dlstatus > 0 AND new.fileorder < 0 '
+            'BEGIN '
+            'INSERT OR IGNORE INTO owner_stats(owner) VALUES (new.owner);'
+            '{0};'
+            'END'.format(update.format(op='+', row='new')))
+
+        self.c.execute('DROP TRIGGER IF EXISTS "delete_file_owner_stats"')
+        self.c.execute(
+            'CREATE TRIGGER "delete_file_owner_stats" '
+            'AFTER DELETE ON "files" WHEN old.dlstatus > 0 '
+            'BEGIN '
+            '{0};'
+            'END'.format(update.format(op='-', row='old')))
+
+        self.c.execute('DROP TRIGGER IF EXISTS "update_file_owner_stats"')
+        self.c.execute(
+            'CREATE TRIGGER "update_file_owner_stats" '
+            'AFTER UPDATE OF size, dlstatus, owner ON "files" '
+            'WHEN old.size != new.size OR old.dlstatus != new.dlstatus '
+            'OR old.owner != new.owner '
+            'BEGIN '
+            '{0} AND old.dlstatus > 0;'
+            'INSERT OR IGNORE INTO owner_stats(owner) '
+            'SELECT new.owner WHERE new.dlstatus > 0;'
+            '{1} AND new.dlstatus > 0;'
+            'END'.format(update.format(op='-', row='old'),
+                         update.format(op='+', row='new')))
+
+        self.c.execute('DELETE FROM owner_stats')
+        self.c.execute(
+            'INSERT INTO owner_stats ' + OWNER_STATS_QUERY)
 
     # -- convert scripts end --
 
     def _create_tables(self):
-        """Create tables for database."""
+        """Create tables of a new database.
+
+        This is the schema of version 7, later changes are applied by the
+        migrations on top of it.
+
+        """
         self.c.execute(
             'CREATE TABLE IF NOT EXISTS "packages" ('
             '"pid" INTEGER PRIMARY KEY AUTOINCREMENT, '
@@ -389,40 +1299,84 @@ class DatabaseBackend(Thread):
         self.c.execute(
             'CREATE INDEX IF NOT EXISTS "stats_time" ON stats(user, time)')
 
-        # try to lower ids
-        self.c.execute('SELECT max(fid) FROM files')
-        fid = self.c.fetchone()[0]
-        fid = int(fid) if fid else 0
-        self.c.execute(
-            'UPDATE SQLITE_SEQUENCE SET seq=? WHERE name=?', (fid, 'files'))
+    def _create_fts(self):
+        """Create the full text index of file names, kept in sync with the
+        files table by triggers.
 
-        self.c.execute('SELECT max(pid) FROM packages')
-        pid = self.c.fetchone()[0]
-        pid = int(pid) if pid else 0
-        self.c.execute(
-            'UPDATE SQLITE_SEQUENCE SET seq=? WHERE name=?', (pid, 'packages'))
+        Falls back to plain LIKE queries when sqlite is built without fts5.
 
-        self.c.execute('VACUUM')
+        """
+        self.c.execute(
+            'SELECT 1 FROM sqlite_master WHERE type="table" '
+            'AND name="files_fts"')
+        exists = self.c.fetchone() is not None
+        try:
+            self.c.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING "
+                "fts5(name, content='files', content_rowid='fid')")
+        except sqlite3.OperationalError:
+            self.fts = False
+            # triggers left by an fts5 enabled build would break any write
+            for trigger in ('insert_file_fts', 'delete_file_fts',
+                            'update_file_fts'):
+                self.c.execute('DROP TRIGGER IF EXISTS "{0}"'.format(trigger))
+            return
+
+        self.fts = True
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "insert_file_fts" '
+            'AFTER INSERT ON "files" WHEN new.fileorder < 0 '
+            'BEGIN '
+            'INSERT INTO files_fts(rowid, name) VALUES (new.fid, new.name);'
+            'END')
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "delete_file_fts" '
+            'AFTER DELETE ON "files" '
+            'BEGIN '
+            'INSERT INTO files_fts(files_fts, rowid, name) '
+            "VALUES ('delete', old.fid, old.name);"
+            'END')
+        self.c.execute(
+            'CREATE TRIGGER IF NOT EXISTS "update_file_fts" '
+            'AFTER UPDATE OF name ON "files" '
+            'BEGIN '
+            'INSERT INTO files_fts(files_fts, rowid, name) '
+            "VALUES ('delete', old.fid, old.name);"
+            'INSERT INTO files_fts(rowid, name) VALUES (new.fid, new.name);'
+            'END')
+        if not exists:
+            self.c.execute(
+                "INSERT INTO files_fts(files_fts) VALUES ('rebuild')")
 
     def create_cursor(self):
         return self.conn.cursor()
 
+    # static, the job already gets the backend as first argument
+    @staticmethod
     @async
     def commit(self):
         self.conn.commit()
 
+    @staticmethod
     @queue
     def sync_save(self):
         self.conn.commit()
 
+    @staticmethod
     @async
     def rollback(self):
         self.conn.rollback()
 
+    def _put(self, job):
+        with self.__synced:
+            self.__enqueued[job.lane] += 1
+            job.seq = self.__enqueued[job.lane]
+            self.jobs.put(job, job.lane)
+
     def async(self, f, *args, **kwargs):
         args = (self,) + args
         job = DatabaseJob(f, *args, **kwargs)
-        self.jobs.put(job)
+        self._put(job)
 
     def queue(self, f, *args, **kwargs):
         # Raise previous error of initialization
@@ -430,13 +1384,100 @@ class DatabaseBackend(Thread):
             raise self.error
         args = (self,) + args
         job = DatabaseJob(f, *args, **kwargs)
-        self.jobs.put(job)
+        self._put(job)
 
         # only wait when db is running
         if self.running:
             job.wait()
+            # the caller blocks anyway, it returns once the readers can see
+            # the changes
+            if self.__wal:
+                target = [0] * len(self.LANES)
+                target[job.lane] = job.seq
+                with self.__synced:
+                    self._wait_committed(target)
         return job.result
 
+    def read(self, f, *args, **kwargs):
+        """Executes a read only method on the calling thread, with a pooled
+        connection.
+
+        The read sees the jobs committed so far, jobs still queued or in the
+        current batch are not waited for, see `wait_lane`.
+
+        """
+        # nested call or already on the backend thread
+        if hasattr(self.__local, 'c'):
+            return f(self, *args, **kwargs)
+        if not self.running or not self.__wal:
+            return self.queue(f, *args, **kwargs)
+
+        queued = time.time()
+        conn = self._acquire_reader()
+        self.conn = conn
+        self.c = conn.cursor()
+        started = time.time()
+        error = True
+        try:
+            result = f(self, *args, **kwargs)
+            error = False
+            return result
+        finally:
+            self.c.close()
+            del self.__local.c, self.__local.conn
+            self.readers.put(conn)
+            self._record(
+                f.__name__, started - queued, time.time() - started, error)
+
+    def wait_lane(self, lane):
+        """Blocks until every job of `lane` enqueued so far has been
+        committed, so `@read` methods see their changes."""
+        # nested call or already on the backend thread
+        if hasattr(self.__local, 'c') or not self.running:
+            return
+        with self.__synced:
+            target = [0] * len(self.LANES)
+            target[lane] = self.__enqueued[lane]
+            self._wait_committed(target)
+
+    def _wait_committed(self, target):
+        """Waits for the committed jobs of every lane to reach `target`,
+        `__synced` has to be held."""
+        if not self._is_committed(target):
+            # wake up the backend thread, its batch may be idle
+            self.jobs.put('sync')
+        self.__waiting += 1
+        try:
+            while not self._is_committed(target):
+                self.__synced.wait()
+        finally:
+            self.__waiting -= 1
+
+    def _is_committed(self, target):
+        return all(c >= t for c, t in zip(self.__committed, target))
+
+    def _acquire_reader(self):
+        try:
+            return self.readers.get_nowait()
+        except Empty:
+            pass
+        with self.__synced:
+            create = self.__readers < self.READERS
+            if create:
+                self.__readers += 1
+        if not create:
+            return self.readers.get()
+        conn = self._connect()
+        conn.execute('PRAGMA query_only=1')
+        return conn
+
+    def _close_readers(self):
+        while True:
+            try:
+                self.readers.get_nowait().close()
+            except Empty:
+                break
+
     @classmethod
     def register_sub(cls, klass):
         cls.subs.append(klass)
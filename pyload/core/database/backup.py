@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import os
+import sys
+import time
+
+from future import standard_library
+
+standard_library.install_aliases()
+
+
+try:
+    from pysqlite2 import dbapi2 as sqlite3
+except Exception:
+    import sqlite3
+
+# pages copied per step and seconds to pause between the steps
+BACKUP_PAGES = 1000
+BACKUP_PAUSE = 0.01
+
+
+def copy_database(conn, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE,
+                  progress=None):
+    """Copy the database of `conn` to file `target` with the online backup
+    api.
+
+    The copy is written next to `target` first and renamed when complete,
+    so `target` is never left torn. `progress` is called with the number of
+    copied and total pages after each step.
+
+    :raises RuntimeError: if the sqlite3 module has no backup api
+
+    """
+    if not hasattr(conn, 'backup'):
+        raise RuntimeError(
+            'The online backup needs the sqlite3 backup api of Python 3.7 '
+            'or later')
+
+    tmp = target + '.part'
+    if os.path.isfile(tmp):
+        os.remove(tmp)
+
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+        if pause and remaining:
+            time.sleep(pause)
+
+    dest = sqlite3.connect(tmp)
+    try:
+        conn.backup(dest, pages=pages, progress=step)
+    finally:
+        dest.close()
+
+    if os.name == 'nt' and os.path.isfile(target):
+        os.remove(target)
+    os.rename(tmp, target)
+
+
+def backup_file(source, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE,
+                progress=None):
+    """Copy database file `source` to `target` while it is in use.
+
+    One read transaction is held during the copy, in WAL mode the writer
+    keeps running and the copy is the state at its beginning. Otherwise
+    the backup would restart whenever another connection commits.
+
+    """
+    conn = sqlite3.connect(source, isolation_level=None)
+    try:
+        conn.execute('BEGIN')
+        conn.execute('SELECT count(*) FROM sqlite_master').fetchall()
+        copy_database(conn, target, pages, pause, progress)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Back up the pyLoad database while the core is running')
+    parser.add_argument('target', help='file to write the backup to')
+    parser.add_argument(
+        '-s', '--source', default='pyload.db',
+        help='database file, pyload.db of the current directory by default')
+    parser.add_argument(
+        '-p', '--pages', type=int, default=BACKUP_PAGES,
+        help='pages copied per step')
+    args = parser.parse_args(argv)
+
+    if not os.path.isfile(args.source):
+        parser.error('{0} does not exist'.format(args.source))
+
+    def progress(done, total):
+        sys.stderr.write('\r{0:d}/{1:d} pages'.format(done, total))
+
+    backup_file(args.source, args.target, args.pages, progress=progress)
+    sys.stderr.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,7 @@ from __future__ import absolute_import, unicode_literals
 
 from future import standard_library
 
-from pyload.core.database.backend import DatabaseMethods, async, queue
+from pyload.core.database.backend import DatabaseMethods, async, queue, read
 
 standard_library.install_aliases()
 
@@ -19,7 +19,7 @@ class ConfigMethods(DatabaseMethods):
             'INSERT INTO settings(plugin, config, user) VALUES(?,?,?)',
             (plugin, config, user))
 
-    @queue
+    @read
     def load_config(self, plugin, user=None):
         if user is None:
             user = -1
@@ -39,7 +39,7 @@ class ConfigMethods(DatabaseMethods):
                 'DELETE FROM settings WHERE plugin=? AND user=?',
                 (plugin, user))
 
-    @queue
+    @read
     def load_all_configs(self):
         self.c.execute('SELECT user, plugin, config FROM settings')
         configs = {}
@@ -51,7 +51,7 @@ class ConfigMethods(DatabaseMethods):
 
         return configs
 
-    @queue
+    @read
     def load_configs_for_user(self, user=None):
         if user is None:
             user = -1
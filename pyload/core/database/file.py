@@ -3,11 +3,16 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import re
+import time
+
 from future import standard_library
 from future.builtins import int
 
 from pyload.api import statestring
-from pyload.core.database.backend import DatabaseMethods, async, inner, queue
+from pyload.core.database.backend import (ORDER_GAP, OWNER_STATS_QUERY,
+                                          DatabaseMethods, async, bulk, inner,
+                                          queue, read, sqlite3)
 from pyload.core.datatype.base import DownloadInfo, DownloadState
 from pyload.core.datatype.file import FileInfo, guess_type
 from pyload.core.datatype.package import PackageInfo, PackageStats
@@ -19,67 +24,188 @@ standard_library.install_aliases()
 _zero_stats = PackageStats(0, 0, 0, 0)
 
 
+def _to_stats(r):
+    """Stats from a (linkstotal, linksdone, sizetotal, sizedone) row."""
+    if r[0] is None:
+        return _zero_stats
+    return PackageStats(r[0], r[1], int(r[2]), int(r[3]))
+
+
+_words = re.compile(r'\w+', re.U)
+
+
+def _match_query(pattern):
+    """Fts5 query matching all words of pattern as prefix, `None` if it
+    contains no words."""
+    words = _words.findall(pattern)
+    if not words:
+        return None
+    return ' '.join('"{0}"*'.format(w) for w in words)
+
+
+_file_query = (
+    'SELECT fid, name, owner, size, status, media, added, fileorder, url, '
+    'plugin, hash, dlstatus, error, package FROM files{0}')
+
+_package_query = (
+    'SELECT p.pid, name, folder, root, owner, site, comment, password, '
+    'added, tags, status, shared, packageorder, linkstotal, linksdone, '
+    'sizetotal, sizedone FROM packages p '
+    'LEFT OUTER JOIN package_stats s ON p.pid = s.pid')
+
+
+# ids of a package and all packages below it, union stops at cycles
+_tree_query = (
+    'WITH RECURSIVE tree(pid) AS (SELECT ? UNION '
+    'SELECT p.pid FROM packages p INNER JOIN tree t ON p.root = t.pid) '
+    'SELECT pid FROM tree')
+
+
+def _file_filter(fts, package, search, state, owner, tree=None):
+    """Where clause and arguments of the file queries."""
+    where = []
+    arg = []
+    if tree is not None:
+        where.append('package IN ({0})'.format(_tree_query))
+        arg.append(tree)
+    if state is not None and state != DownloadState.All:
+        where.append('dlstatus IN ({0})'.format(statestring(state)))
+    if owner is not None:
+        where.append('owner=?')
+        arg.append(owner)
+    if package is not None:
+        where.append('package=?')
+        arg.append(package)
+    if search is not None:
+        match = _match_query(search) if fts else None
+        if match is None:
+            where.append('name LIKE ?')
+            arg.append('%{0}%'.format(search.strip('%')))
+        else:
+            where.append('fid IN (SELECT rowid FROM files_fts '
+                         'WHERE files_fts MATCH ?)')
+            arg.append(match)
+    if not where:
+        return '', arg
+    return ' WHERE ' + ' AND '.join(where), arg
+
+
+def _tag_filter(tags, match_all):
+    """Where clause and arguments selecting packages by tag, with all or any
+    of `tags`."""
+    tags = _split_tags(tags)
+    qry = 'p.pid IN (SELECT pid FROM package_tags WHERE tag IN ({0}){1})'
+    having = (' GROUP BY pid HAVING count(*) = {0:d}'.format(len(tags))
+              if match_all else '')
+    return qry.format(', '.join('?' * len(tags)), having), tags
+
+
+def _split_tags(tags):
+    """Tags without blanks and duplicates, in order."""
+    return list(OrderedDict.fromkeys(
+        t.strip() for t in tags if t and t.strip()))
+
+
+def _to_file_info(r, status_msg):
+    """FileInfo from a row of `_file_query`."""
+    finfo = FileInfo(r[0], r[1], r[13], r[2], r[3], r[4], r[5], r[6], r[7])
+    if r[11] > 0:  # dl status != NA
+        finfo.download = DownloadInfo(
+            r[8], r[9], r[10], r[11], status_msg[r[11]], r[12])
+    return finfo
+
+
+def _to_package_info(r):
+    """PackageInfo from a row of `_package_query`."""
+    return PackageInfo(
+        r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[8],
+        r[9].split(','), r[10], r[11], r[12], _to_stats(r[13:]))
+
+
+# rows per job of the chunked bulk updates
+_bulk_chunk = 1000
+
+# window functions are available since SQLite 3.25
+_windows = sqlite3.sqlite_version_info >= (3, 25, 0)
+
+# id, parent and sort key column of the ordered tables
+_order_columns = {
+    'files': ('fid', 'package', 'fileorder'),
+    'packages': ('pid', 'root', 'packageorder'),
+}
+
+
 class FileMethods(DatabaseMethods):
 
-    @queue
+    @read
     def filecount(self):
         """Returns number of files, currently only used for debugging."""
         self.c.execute('SELECT COUNT(*) FROM files')
         return self.c.fetchone()[0]
 
-    @queue
-    def downloadstats(self, user=None):
-        """Number of downloads and size."""
+    @inner
+    def _owner_stats(self, columns, user):
+        """Sum of two `owner_stats` columns of one or all users."""
+        qry = 'SELECT SUM({0}), SUM({1}) FROM owner_stats'.format(*columns)
         if user is None:
-            self.c.execute('SELECT COUNT(*), SUM(f.size) FROM files f '
-                           'WHERE dlstatus != 0')
+            self.c.execute(qry)
         else:
-            self.c.execute(
-                'SELECT COUNT(*), SUM(f.size) FROM files f WHERE f.owner=? '
-                'AND dlstatus != 0', (user,))
-
+            self.c.execute(qry + ' WHERE owner=?', (user,))
         r = self.c.fetchone()
         # sum is None when no elements are added
-        return (r[0], r[1] if r[1] is not None else 0) if r else (0, 0)
+        return (r[0] or 0, r[1] or 0) if r else (0, 0)
+
+    @read
+    def downloadstats(self, user=None):
+        """Number of downloads and size."""
+        return self._owner_stats(('linkstotal', 'sizetotal'), user)
 
     # TODO: missing and not possible DLs ?
-    @queue
+    @read
     def queuestats(self, user=None):
         """Number and size of files in queue not finished yet."""
         # status not in NA, finished, skipped
-        if user is None:
-            self.c.execute(
-                'SELECT COUNT(*), SUM(f.size) FROM files f WHERE dlstatus '
-                'NOT IN (0,5,6)')
-        else:
-            self.c.execute(
-                'SELECT COUNT(*), SUM(f.size) FROM files f WHERE f.owner=? '
-                'AND dlstatus NOT IN (0,5,6)', (user,))
-
-        r = self.c.fetchone()
-        return (r[0], r[1] if r[1] is not None else 0) if r else (0, 0)
+        return self._owner_stats(('linksqueued', 'sizequeued'), user)
 
     # TODO: multi user?
-    @queue
+    @read
     def processcount(self, fid=-1, user=None):
         """Number of files which have to be processed."""
         # status in online, queued, starting, waiting, downloading
+        count = self._owner_stats(('linksprocess', 'sizeprocess'), user)[0]
         self.c.execute(
-            'SELECT COUNT(*), SUM(size) FROM files '
-            'WHERE dlstatus IN (2,3,8,9,10) AND fid != ?', (fid,))
-        return self.c.fetchone()[0]
+            'SELECT COUNT(*) FROM files '
+            'WHERE fid = ? AND dlstatus IN (2,3,8,9,10)', (fid,))
+        return count - self.c.fetchone()[0]
 
-    @queue
+    @read
     def processstats(self, user=None):
-        if user is None:
-            self.c.execute('SELECT COUNT(*), SUM(size) FROM files '
-                           'WHERE dlstatus IN (2,3,8,9,10)')
-        else:
-            self.c.execute(
-                'SELECT COUNT(*), SUM(f.size) FROM files f '
-                'WHERE f.owner=? AND dlstatus IN (2,3,8,9,10)', (user,))
-        r = self.c.fetchone()
-        return (r[0], r[1] if r[1] is not None else 0) if r else (0, 0)
+        return self._owner_stats(('linksprocess', 'sizeprocess'), user)
+
+    @read
+    def get_owner_stats(self):
+        """Dict of owner -> (links, size, links queued, size queued, links
+        to process, size to process)."""
+        self.c.execute('SELECT * FROM owner_stats')
+        return dict((r[0], tuple(r[1:])) for r in self.c.fetchall())
+
+    @async
+    @bulk
+    def reconcile_owner_stats(self):
+        """Compare the counters maintained by triggers with the files and
+        correct them when they drifted apart."""
+        self.c.execute(OWNER_STATS_QUERY)
+        expected = dict((r[0], tuple(r[1:])) for r in self.c.fetchall())
+        self.c.execute('SELECT * FROM owner_stats')
+        stats = dict((r[0], tuple(r[1:])) for r in self.c.fetchall()
+                     if any(r[1:]))
+        if stats == expected:
+            return
+        self.pyload.log.debug(
+            'Owner stats out of sync, recounting {0:d} users'.format(
+                len(expected)))
+        self.c.execute('DELETE FROM owner_stats')
+        self.c.execute('INSERT INTO owner_stats ' + OWNER_STATS_QUERY)
 
     @queue
     def add_link(self, url, name, plugin, package, owner):
@@ -93,10 +219,42 @@ class FileMethods(DatabaseMethods):
     @async
     def add_links(self, links, package, owner):
         """Links is a list of tuples (url, plugin)."""
-        links = [(x[0], x[0], x[1], package, owner) for x in links]
+        # the insert triggers skip rows with an order, so order, added time,
+        # stats and search index are handled once for the whole batch
+        self.c.execute(
+            'SELECT max(fileorder) FROM files WHERE package=?', (package,))
+        order = self.c.fetchone()[0]
+        if order is None:
+            order = -ORDER_GAP
+        self.c.execute('SELECT max(fid) FROM files')
+        last = self.c.fetchone()[0] or 0
+
+        added = int(time.time())
+        links = [(x[0], x[0], x[1], package, owner, added,
+                  order + ORDER_GAP * (i + 1)) for i, x in enumerate(links)]
+        if not links:
+            return
         self.c.executemany(
             'INSERT INTO files(url, name, plugin, status, dlstatus, package, '
-            'owner) VALUES(?,?,?,1,3,?,?)', links)
+            'owner, added, fileorder) VALUES(?,?,?,1,3,?,?,?,?)', links)
+
+        # ids of autoincrement tables never go back
+        if self.fts:
+            self.c.execute(
+                'INSERT INTO files_fts(rowid, name) '
+                'SELECT fid, name FROM files WHERE fid > ?', (last,))
+        self.c.execute(
+            'INSERT OR IGNORE INTO package_stats(pid) VALUES (?)', (package,))
+        self.c.execute(
+            'UPDATE package_stats SET linkstotal = linkstotal + ? '
+            'WHERE pid=?', (len(links), package))
+        # bulk links are queued with unknown size
+        self.c.execute(
+            'INSERT OR IGNORE INTO owner_stats(owner) VALUES (?)', (owner,))
+        self.c.execute(
+            'UPDATE owner_stats SET linkstotal = linkstotal + ?, '
+            'linksqueued = linksqueued + ?, linksprocess = linksprocess + ? '
+            'WHERE owner=?', (len(links),) * 3 + (owner,))
 
     @queue
     def add_file(self, name, size, media, package, owner):
@@ -125,165 +283,219 @@ class FileMethods(DatabaseMethods):
                 'DELETE FROM packages WHERE pid=? AND owner=?', (pid, owner))
 
     @async
-    def delete_file(self, fid, order, package, owner=None):
-        """To delete a file order and package of it is needed."""
+    def delete_file(self, fid, owner=None):
+        """Following files keep their order, keys only need to be sorted."""
         if owner is None:
             self.c.execute('DELETE FROM files WHERE fid=?', (fid,))
-            self.c.execute(
-                'UPDATE files SET fileorder=fileorder-1 WHERE fileorder > ? '
-                'AND package=?', (order, package))
         else:
             self.c.execute(
                 'DELETE FROM files WHERE fid=? AND owner=?', (fid, owner))
-            self.c.execute(
-                'UPDATE files SET fileorder=fileorder-1 WHERE fileorder > ? '
-                'AND package=? AND owner=?', (order, package, owner))
 
-    @queue
-    def get_all_files(self, package=None, state=None, owner=None):
+    @read
+    def get_all_files(self, package=None, search=None, state=None,
+                      owner=None, tree=None):
         """Return dict with file information.
 
         :param package: optional package to filter out
         :param search: or search string for file name
-        :param unfinished: filter by dlstatus not finished
+        :param state: filter by download state
         :param owner: only specific owner
+        :param tree: only files of this package and the packages below it
 
         """
-        qry = ('SELECT fid, name, owner, size, status, media, added, '
-               'fileorder, url, plugin, hash, dlstatus, error, package '
-               'FROM files WHERE ')
-
-        arg = []
-
-        if state is not None and state != DownloadState.All:
-            qry += 'dlstatus IN ({0}) AND '.format(statestring(state))
-        if owner is not None:
-            qry += 'owner=? AND '
-            arg.append(owner)
-
-        if package is not None:
-            arg.append(package)
-            qry += 'package=? AND '
-        # if search is not None:
-            # search = '%%{0}%%'.format(search.strip('%'))
-            # arg.append(search)
-            # qry += 'name LIKE ? '
-
-        # make qry valid
-        if qry.endswith('WHERE '):
-            qry = qry[:-6]
-        if qry.endswith('AND '):
-            qry = qry[:-4]
-
-        self.c.execute(qry + 'ORDER BY package, fileorder', arg)
+        where, arg = _file_filter(
+            self.fts, package, search, state, owner, tree)
+        self.c.execute(
+            _file_query.format(where) + ' ORDER BY package, fileorder', arg)
 
         data = OrderedDict()
         for r in self.c.fetchall():
-            finfo = FileInfo(r[0], r[1], r[13], r[2],
-                             r[3], r[4], r[5], r[6], r[7])
-            if r[11] > 0:  # dl status != NA
-                finfo.download = DownloadInfo(
-                    r[8],
-                    r[9],
-                    r[10],
-                    r[11],
-                    self.manager.status_msg[r[11]],
-                    r[12])
-            data[r[0]] = finfo
-
+            data[r[0]] = _to_file_info(r, self.manager.status_msg)
         return data
 
-    @queue
+    @read
+    def get_files_page(self, cursor=None, limit=100, package=None,
+                       state=None, owner=None):
+        """Return list with at most `limit` files, ordered by package and
+        position.
+
+        :param cursor: (package, fileorder) of the last file of the previous
+            page, the page starts at the first file if `None`
+        :param limit: maximal number of files
+        :param package: optional package to filter out
+        :param state: filter by download state
+        :param owner: only specific owner
+
+        """
+        where, arg = _file_filter(self.fts, package, None, state, owner)
+        if cursor is not None:
+            # first term bounds the index range, the rest skips within it
+            where += (' AND ' if where else ' WHERE ') + (
+                'package >= ? AND (package > ? OR fileorder > ?)')
+            arg.extend((cursor[0], cursor[0], cursor[1]))
+        arg.append(limit)
+        self.c.execute(
+            _file_query.format(where) + ' ORDER BY package, fileorder '
+            'LIMIT ?', arg)
+        return [_to_file_info(r, self.manager.status_msg)
+                for r in self.c.fetchall()]
+
+    @inner
+    def iter_files(self, package=None, state=None, owner=None, size=500):
+        """Yields the files like `get_all_files`, loading `size` of them at
+        a time."""
+        cursor = None
+        while True:
+            page = self.get_files_page(cursor, size, package, state, owner)
+            for finfo in page:
+                yield finfo
+            if len(page) < size:
+                break
+            cursor = (page[-1].package, page[-1].fileorder)
+
+    @read
     def get_matching_filenames(self, pattern, owner=None):
         """Return matching file names for pattern, useful for search
-        suggestions."""
-        qry = 'SELECT name FROM files WHERE name LIKE ?'
-        args = ['%%{0}%%'.format(pattern.strip('%'))]
+        suggestions.
+
+        Words of the pattern are matched as prefix of the words in the
+        name, best matches first.
+
+        """
+        match = _match_query(pattern) if self.fts else None
+        if match is None:
+            qry = 'SELECT name FROM files WHERE name LIKE ?'
+            args = ['%{0}%'.format(pattern.strip('%'))]
+        else:
+            qry = ('SELECT f.name FROM files_fts JOIN files f '
+                   'ON f.fid = files_fts.rowid WHERE files_fts MATCH ?')
+            args = [match]
         if owner:
             qry += ' AND owner=?'
             args.append(owner)
+        if match is not None:
+            qry += ' ORDER BY files_fts.rank'
 
         self.c.execute(qry, args)
         return [r[0] for r in self.c.fetchall()]
 
-    @queue
-    def get_all_packages(self, root=None, owner=None, tags=None):
+    @read
+    def get_all_packages(self, root=None, owner=None, tags=None,
+                         match_all=True, tree=None):
         """Return dict with package information.
 
         :param root: optional root to filter
         :param owner: optional user id
         :param tags: optional tag list
+        :param match_all: packages need all `tags`, otherwise any of them
+        :param tree: only this package and the packages below it
 
         """
-        qry = (
-            'SELECT pid, name, folder, root, owner, site, comment, password, '
-            'added, tags, status, shared, packageorder FROM packages{} '
-            'ORDER BY root, packageorder')
-
-        if root is None:
-            stats = self.get_package_stats(owner=owner)
-            if owner is None:
-                self.c.execute(qry.format(''))
-            else:
-                self.c.execute(qry.format(' WHERE owner=?'), (owner,))
-        else:
-            stats = self.get_package_stats(root=root, owner=owner)
-            if owner is None:
-                self.c.execute(qry.format(
-                    ' WHERE root=? OR pid=?'), (root, root))
-            else:
-                self.c.execute(
-                    qry.format(' WHERE (root=? OR pid=?) AND owner=?'),
-                    (root, root, owner))
+        where = []
+        arg = []
+        if tree is not None:
+            where.append('p.pid IN ({0})'.format(_tree_query))
+            arg.append(tree)
+        if root is not None:
+            where.append('(root=? OR p.pid=?)')
+            arg.extend((root, root))
+        if owner is not None:
+            where.append('owner=?')
+            arg.append(owner)
+        if tags:
+            qry, tags = _tag_filter(tags, match_all)
+            where.append(qry)
+            arg.extend(tags)
+
+        qry = _package_query
+        if where:
+            qry += ' WHERE ' + ' AND '.join(where)
+        self.c.execute(qry + ' ORDER BY root, packageorder', arg)
 
         data = OrderedDict()
         for r in self.c.fetchall():
-            data[r[0]] = PackageInfo(
-                r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[
-                    8], r[9].split(','), r[10], r[11], r[12],
-                stats.get(r[0], _zero_stats)
-            )
+            data[r[0]] = _to_package_info(r)
         return data
 
+    @read
+    def find_packages(self, tags, owner=None, match_all=True):
+        """Return dict of the packages tagged with all of `tags`, or any of
+        them if `match_all` is false."""
+        if not _split_tags(tags):
+            return OrderedDict()
+        return self.get_all_packages(
+            owner=owner, tags=tags, match_all=match_all)
+
+    @read
+    def get_packages_page(self, cursor=None, limit=100, root=None,
+                          owner=None):
+        """Return list with at most `limit` packages, ordered by root and
+        position.
+
+        :param cursor: (root, packageorder) of the last package of the
+            previous page, the page starts at the first package if `None`
+        :param limit: maximal number of packages
+        :param root: optional root to filter, only its direct children
+        :param owner: optional user id
+
+        """
+        where = []
+        arg = []
+        if root is not None:
+            where.append('root=?')
+            arg.append(root)
+        if owner is not None:
+            where.append('owner=?')
+            arg.append(owner)
+        if cursor is not None:
+            where.append('root >= ? AND (root > ? OR packageorder > ?)')
+            arg.extend((cursor[0], cursor[0], cursor[1]))
+        arg.append(limit)
+        where = ' WHERE ' + ' AND '.join(where) if where else ''
+        self.c.execute(
+            _package_query + where + ' ORDER BY root, packageorder LIMIT ?',
+            arg)
+        return [_to_package_info(r) for r in self.c.fetchall()]
+
+    @inner
+    def iter_packages(self, root=None, owner=None, size=500):
+        """Yields the packages ordered by root and position, loading `size`
+        of them at a time."""
+        cursor = None
+        while True:
+            page = self.get_packages_page(cursor, size, root, owner)
+            for pinfo in page:
+                yield pinfo
+            if len(page) < size:
+                break
+            cursor = (page[-1].root, page[-1].packageorder)
+
     @inner
     def get_package_stats(self, pid=None, root=None, owner=None):
         qry = (
-            'SELECT p.pid, SUM(f.size) AS sizetotal, COUNT(f.fid) '
-            'AS linkstotal, sizedone, linksdone FROM packages p JOIN files f '
-            'ON p.pid = f.package AND f.dlstatus > 0 {0} LEFT OUTER '
-            'JOIN (SELECT p.pid AS pid, SUM(f.size) AS sizedone, COUNT(f.fid) '
-            'AS linksdone FROM packages p JOIN files f '
-            'ON p.pid = f.package {0} AND f.dlstatus in (5,6) '
-            'GROUP BY p.pid) s ON s.pid = p.pid GROUP BY p.pid')
-
-        # status in (finished, skipped, processing)
+            'SELECT s.pid, linkstotal, linksdone, sizetotal, sizedone '
+            'FROM package_stats s{0}')
 
         if root is not None:
             self.c.execute(qry.format(
-                'AND (p.root=:root OR p.pid=:root)'), locals())
+                ' JOIN packages p ON p.pid = s.pid '
+                'WHERE p.root=:root OR p.pid=:root'), locals())
         elif pid is not None:
-            self.c.execute(qry.format('AND p.pid=:pid'), locals())
+            self.c.execute(qry.format(' WHERE s.pid=:pid'), locals())
         elif owner is not None:
-            self.c.execute(qry.format('AND p.owner=:owner'), locals())
+            self.c.execute(qry.format(
+                ' JOIN packages p ON p.pid = s.pid '
+                'WHERE p.owner=:owner'), locals())
         else:
             self.c.execute(qry.format(''))
 
-        data = {}
-        for r in self.c.fetchall():
-            data[r[0]] = PackageStats(
-                r[2] if r[2] else 0,
-                r[4] if r[4] else 0,
-                int(r[1]) if r[1] else 0,
-                int(r[3]) if r[3] else 0,
-            )
-
-        return data
+        return dict((r[0], _to_stats(r[1:])) for r in self.c.fetchall())
 
-    @queue
+    @read
     def get_stats_for_package(self, pid):
-        return self.get_package_stats(pid=pid)[pid]
+        return self.get_package_stats(pid=pid).get(pid, _zero_stats)
 
-    @queue
+    @read
     def get_file_info(self, fid, force=False):
         """Get data for specific file, when force is true download info will be
         appended."""
@@ -305,16 +517,15 @@ class FileMethods(DatabaseMethods):
                 r[12])
         return finfo
 
-    @queue
+    @read
     def get_package_info(self, pid, stats=True):
         """Get data for a specific package, optionally with package stats."""
-        if stats:
-            stats = self.get_package_stats(pid=pid)
-
         self.c.execute(
-            'SELECT pid, name, folder, root, owner, site, comment, password, '
-            'added, tags, status, shared, packageorder FROM packages '
-            'WHERE pid=?', (pid,))
+            'SELECT p.pid, name, folder, root, owner, site, comment, '
+            'password, added, tags, status, shared, packageorder, '
+            'linkstotal, linksdone, sizetotal, sizedone FROM packages p '
+            'LEFT OUTER JOIN package_stats s ON p.pid = s.pid '
+            'WHERE p.pid=?', (pid,))
 
         r = self.c.fetchone()
         if not r:
@@ -323,25 +534,48 @@ class FileMethods(DatabaseMethods):
             return PackageInfo(
                 r[0], r[1], r[2], r[3], r[4], r[5], r[6], r[7], r[
                     8], r[9].split(','), r[10], r[11], r[12],
-                stats.get(r[0], _zero_stats) if stats else None
+                _to_stats(r[13:]) if stats else None
             )
 
     # TODO: does this need owner?
-    @async
+    @inner
     def update_link_info(self, data):
         """Data is list of tuples (name, size, status,[ hash,] url)."""
-        # inserts media type as n-1th arguments
-        data = [info[:-1] + (guess_type(info[0]), info[-1]) for info in data]
+        # one job per chunk, other jobs can run in between
+        data = list(data)
+        for i in range(0, len(data), _bulk_chunk):
+            self._update_link_info(data[i:i + _bulk_chunk])
 
+    @async
+    @bulk
+    def _update_link_info(self, data):
+        # hash is optional, `None` keeps the current one
+        rows = [(info[-1], info[0], info[1], info[2],
+                 info[3] if len(info) == 5 else None, guess_type(info[0]))
+                for info in data]
+
+        # results are joined by url instead of one scan per result
+        self.c.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS "link_info" ('
+            '"url" TEXT PRIMARY KEY, "name" TEXT, "size" INTEGER, '
+            '"dlstatus" INTEGER, "hash" TEXT, "media" INTEGER)')
+        self.c.executemany(
+            'INSERT OR REPLACE INTO link_info '
+            '(url, name, size, dlstatus, hash, media) '
+            'VALUES (?, ?, ?, ?, ?, ?)', rows)
         # status in (NA, Offline, Online, Queued, TempOffline)
-        if data and len(data[0]) == 5:
-            self.c.executemany(
-                'UPDATE files SET name=?, size=?, dlstatus=?, media=? '
-                'WHERE url=? AND dlstatus IN (0,1,2,3,11)', data)
-        else:
-            self.c.executemany(
-                'UPDATE files SET name=?, size=?, dlstatus=?, hash=?, media=? '
-                'WHERE url=? AND dlstatus IN (0,1,2,3,11)', data)
+        self.c.execute(
+            'UPDATE files SET '
+            'name=(SELECT i.name FROM link_info i WHERE i.url=files.url), '
+            'size=(SELECT i.size FROM link_info i WHERE i.url=files.url), '
+            'dlstatus=(SELECT i.dlstatus FROM link_info i '
+            'WHERE i.url=files.url), '
+            'hash=coalesce((SELECT i.hash FROM link_info i '
+            'WHERE i.url=files.url), hash), '
+            'media=(SELECT i.media FROM link_info i WHERE i.url=files.url) '
+            'WHERE url IN (SELECT url FROM link_info) '
+            'AND dlstatus IN (0,1,2,3,11)')
+        self.c.execute('DELETE FROM link_info')
 
     @async
     def update_file(self, f):
@@ -351,6 +585,20 @@ class FileMethods(DatabaseMethods):
             (f.name, f.size, f.filestatus, f.media, f.url, f.hash,
              f.status, f.error, f.fid))
 
+    @async
+    def update_files(self, changes):
+        """Changes is a list of (fid, dict of column -> value), files with the
+        same changed columns are written by one statement."""
+        rows = {}
+        for fid, columns in changes:
+            names = tuple(sorted(columns))
+            rows.setdefault(names, []).append(
+                tuple(columns[name] for name in names) + (fid,))
+        for names, data in rows.items():
+            self.c.executemany(
+                'UPDATE files SET {0} WHERE fid=?'.format(', '.join(
+                    '{0}=?'.format(name) for name in names)), data)
+
     @async
     def set_download_status(self, fid, status):
         self.c.execute(
@@ -363,74 +611,129 @@ class FileMethods(DatabaseMethods):
             'password=?, tags=?, status=?, shared=? WHERE pid=?',
             (p.name, p.folder, p.site, p.comment, p.password,
              ','.join(p.tags), p.status, p.shared, p.pid))
+        self.c.execute('DELETE FROM package_tags WHERE pid=?', (p.pid,))
+        self.c.executemany(
+            'INSERT INTO package_tags(pid, tag) VALUES (?, ?)',
+            ((p.pid, tag) for tag in _split_tags(p.tags)))
 
-    # TODO: most modifying methods needs owner argument to avoid checking
-    # beforehand
-    @async
-    def order_package(self, pid, root, oldorder, order):
-        if oldorder > order:  # package moved upwards
-            self.c.execute(
-                'UPDATE packages SET packageorder=packageorder+1 '
-                'WHERE packageorder >= ? AND packageorder < ? AND root=? '
-                'AND packageorder >= 0', (order, oldorder, root))
-        elif oldorder < order:  # moved downwards
-            self.c.execute(
-                'UPDATE packages SET packageorder=packageorder-1 '
-                'WHERE packageorder <= ? AND packageorder > ? AND root=? '
-                'AND packageorder >= 0', (order, oldorder, root))
-
+    @inner
+    def _renumber(self, fmt, parent, gap=ORDER_GAP):
+        """Spread the sort keys of all items in parent evenly."""
         self.c.execute(
-            'UPDATE packages SET packageorder=? WHERE pid=?', (order, pid))
+            'SELECT {id} FROM {table} WHERE {parent}=? AND {order} >= 0 '
+            'ORDER BY {order}'.format(**fmt), (parent,))
+        data = [((i + 1) * gap, r[0]) for i, r in enumerate(self.c.fetchall())]
+        self.c.executemany(
+            'UPDATE {table} SET {order}=? WHERE {id}=?'.format(**fmt), data)
+        return dict((id, order) for order, id in data)
 
-    @async
-    def order_files(self, pid, fids, oldorder, order):
-        diff = len(fids)
-        data = []
+    @inner
+    def _place(self, fmt, parent, ids, index):
+        """Gives ids consecutive keys in front of the item at index, when the
+        block is taken out, or None if there is no gap left."""
+        args = [parent] + ids
+        qry = (
+            'SELECT {order} FROM {table} WHERE {parent}=? AND {order} >= 0 '
+            'AND {id} NOT IN ({ids}) ORDER BY {order}').format(**fmt)
+        if index > 0:
+            self.c.execute(qry + ' LIMIT 2 OFFSET ?', args + [index - 1])
+            keys = [r[0] for r in self.c.fetchall()]
+        else:
+            # keys do not become negative, these are unordered
+            self.c.execute(qry + ' LIMIT 1', args)
+            keys = [-1] + [r[0] for r in self.c.fetchall()]
 
-        if oldorder > order:  # moved upwards
-            self.c.execute(
-                'UPDATE files SET fileorder=fileorder+? WHERE fileorder >= ? '
-                'AND fileorder < ? AND package=?',
-                (diff, order, oldorder, pid))
-            data = [(order + i, fid) for i, fid in enumerate(fids)]
-        elif oldorder < order:
+        if not keys:
+            # index is behind the last item
             self.c.execute(
-                'UPDATE files SET fileorder=fileorder-? WHERE fileorder <= ? '
-                'AND fileorder >= ? AND package=?',
-                (diff, order, oldorder + diff, pid))
-            data = [(order - diff + i + 1, fid) for i, fid in enumerate(fids)]
+                'SELECT max({order}) FROM {table} WHERE {parent}=? '
+                'AND {order} >= 0 AND {id} NOT IN ({ids})'.format(**fmt), args)
+            last = self.c.fetchone()[0]
+            keys = [last if last is not None else -ORDER_GAP]
+
+        if len(keys) > 1:
+            step = (keys[1] - keys[0]) // (len(ids) + 1)
+            if step < 1:
+                return
+        else:
+            step = ORDER_GAP
 
-        self.c.executemany('UPDATE files SET fileorder=? WHERE fid=?', data)
+        data = [(keys[0] + step * (i + 1), id) for i, id in enumerate(ids)]
+        self.c.executemany(
+            'UPDATE {table} SET {order}=? WHERE {id}=?'.format(**fmt), data)
+        return dict((id, order) for order, id in data)
 
-    @async
+    @inner
+    def _insert_order(self, table, parent, ids, position):
+        """Moves ids to position within parent. Only their own keys change,
+        unless there is no gap left and parent needs to be renumbered.
+
+        Returns dict of all changed sort keys.
+
+        """
+        fmt = dict(zip(('id', 'parent', 'order'), _order_columns[table]))
+        fmt.update(table=table, ids=','.join('?' * len(ids)))
+        ids = list(ids)
+
+        # position the block currently starts at
+        self.c.execute(
+            'SELECT COUNT(*) FROM {table} WHERE {parent}=? AND {order} >= 0 '
+            'AND {order} < (SELECT min({order}) FROM {table} '
+            'WHERE {id} IN ({ids}))'.format(**fmt), [parent] + ids)
+        start = self.c.fetchone()[0]
+        if position == start:
+            return {}
+        # moved downwards, the block ends at position
+        if position > start:
+            position -= len(ids) - 1
+
+        orders = self._place(fmt, parent, ids, position)
+        if orders is None:
+            orders = self._renumber(fmt, parent, ORDER_GAP * len(ids))
+            orders.update(self._place(fmt, parent, ids, position))
+        return orders
+
+    # TODO: most modifying methods needs owner argument to avoid checking
+    # beforehand
+    @queue
+    def order_package(self, pid, root, position):
+        """Returns dict of changed package orders."""
+        return self._insert_order('packages', root, [pid], position)
+
+    @queue
+    def order_files(self, pid, fids, position):
+        """Returns dict of changed file orders."""
+        return self._insert_order('files', pid, fids, position)
+
+    @queue
     def move_files(self, pid, fids, package):
+        """Appends fids to package, remaining files in pid keep their
+        order.
+
+        Returns dict of changed file orders.
+        """
         self.c.execute(
             'SELECT max(fileorder) FROM files WHERE package=?', (package,))
         r = self.c.fetchone()
-        order = (r[0] if r[0] else 0) + 1
-
-        self.c.execute(
-            'UPDATE files SET fileorder=fileorder-? WHERE fileorder > ? '
-            'AND package=?', (len(fids), order, pid))
+        order = r[0] if r[0] is not None else -ORDER_GAP
 
-        data = [(package, order + i, fid) for i, fid in enumerate(fids)]
+        data = [(package, order + ORDER_GAP * (i + 1), fid)
+                for i, fid in enumerate(fids)]
         self.c.executemany(
             'UPDATE files SET package=?, fileorder=? WHERE fid=?', data)
+        return dict((fid, order) for _, order, fid in data)
 
     @async
-    def move_package(self, root, order, pid, dpid):
+    def move_package(self, pid, dpid):
+        """Appends pid to dpid, remaining packages keep their order."""
         self.c.execute(
             'SELECT max(packageorder) FROM packages WHERE root=?', (dpid,))
         r = self.c.fetchone()
-        max = (r[0] if r[0] else 0) + 1
-
-        self.c.execute(
-            'UPDATE packages SET packageorder=packageorder-1 '
-            'WHERE packageorder > ? AND root=?', (order, root))
+        order = (r[0] if r[0] is not None else -ORDER_GAP) + ORDER_GAP
 
         self.c.execute(
             'UPDATE packages SET root=?, packageorder=? WHERE pid=?',
-            (dpid, max, pid))
+            (dpid, order, pid))
 
     @async
     def restart_file(self, fid):
@@ -443,32 +746,36 @@ class FileMethods(DatabaseMethods):
         # status -> queued
         self.c.execute('UPDATE files SET status=3 WHERE package=?', (pid,))
 
-    @queue
+    @read
     def get_jobs(self, occ):
         """Return file ids, which are suitable for download and do not use a
         occupied plugin."""
-        cmd = '({0})'.format(', '.join("'{0}'".format(x) for x in occ))
+        # occupied plugins are bound as one parameter, so the statement text
+        # never changes and stays in the statement cache
+        occ = ',{0},'.format(','.join(occ))
 
         # dlstatus in online, queued, occupied | package status = ok
-        cmd = (
-            'SELECT f.owner, f.fid FROM files as f INNER JOIN packages '
-            'as p ON f.package=p.pid WHERE f.owner=? AND f.plugin NOT IN {} '
-            'AND f.dlstatus IN (2,3,16) AND p.status=0 '
-            'ORDER BY p.packageorder ASC, f.fileorder ASC LIMIT 1').format(cmd)
-
-        self.c.execute('SELECT uid FROM users')
-        uids = self.c.fetchall()
-        jobs = {}
-        # get jobs for all uids
-        for uid in uids:
-            self.c.execute(cmd, uid)
-            r = self.c.fetchone()
-            if r:
-                jobs[r[0]] = r[1]
-
-        return jobs
+        if _windows:
+            self.c.execute(
+                'SELECT owner, fid FROM (SELECT f.owner, f.fid, ROW_NUMBER() '
+                'OVER (PARTITION BY f.owner ORDER BY p.packageorder ASC, '
+                'f.fileorder ASC) AS pos FROM files as f INNER JOIN packages '
+                'as p ON f.package=p.pid INNER JOIN users as u '
+                'ON f.owner=u.uid WHERE f.dlstatus IN (2,3,16) '
+                "AND instr(?, ',' || f.plugin || ',') = 0 AND p.status=0) "
+                'WHERE pos=1', (occ,))
+        else:
+            self.c.execute(
+                'SELECT uid, (SELECT f.fid FROM files as f INNER JOIN '
+                'packages as p ON f.package=p.pid WHERE f.owner=u.uid '
+                'AND f.dlstatus IN (2,3,16) '
+                "AND instr(?, ',' || f.plugin || ',') = 0 AND p.status=0 "
+                'ORDER BY p.packageorder ASC, f.fileorder ASC LIMIT 1) AS fid '
+                'FROM users as u WHERE fid IS NOT NULL', (occ,))
 
-    @queue
+        return dict(self.c.fetchall())
+
+    @read
     def get_unfinished(self, pid):
         """Return list of max length 3 ids with pyfiles in package not finished
         or processed."""
@@ -479,6 +786,7 @@ class FileMethods(DatabaseMethods):
         return [r[0] for r in self.c.fetchall()]
 
     @queue
+    @bulk
     def restart_failed(self, owner=None):
         # status=queued, where status in failed, aborted, temp offline, file
         # mismatch
@@ -486,7 +794,7 @@ class FileMethods(DatabaseMethods):
             "UPDATE files SET dlstatus=3, error='' WHERE dlstatus "
             'IN (7, 11, 12, 15)')
 
-    @queue
+    @read
     def find_duplicates(self, id, folder, filename):
         """
         Checks if filename exists with different id and same package,
@@ -500,6 +808,7 @@ class FileMethods(DatabaseMethods):
         return self.c.fetchone()
 
     @queue
+    @bulk
     def purge_links(self):
         # fstatus = missing
         self.c.execute('DELETE FROM files WHERE status == 1')
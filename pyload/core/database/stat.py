@@ -2,17 +2,130 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import time
+
 from future import standard_library
 
-from pyload.core.database.backend import DatabaseMethods
+from pyload.core.database.backend import DatabaseMethods, async, read
 
 standard_library.install_aliases()
 
 
+MINUTE = 60
+HOUR = 60 * 60
+DAY = 24 * 60 * 60
+
+# bucket width -> seconds the buckets are kept, `None` to keep them forever
+RETENTION = {
+    MINUTE: 2 * DAY,
+    HOUR: 90 * DAY,
+    DAY: None,
+}
+PERIODS = tuple(sorted(RETENTION))
+
+
+def _bucket(ts, period):
+    return int(ts) // period * period
+
+
+def _ceil(ts, period):
+    return -(-int(ts) // period) * period
+
+
+def _user_filter(user):
+    if user is None:
+        return '', ()
+    return ' AND user=?', (user,)
+
+
+def _sum_range(c, user, start, end, periods):
+    """Sum the whole buckets of the first period within the range and the
+    remaining edges with the finer ones."""
+    if not periods or start >= end:
+        return 0
+    period, finer = periods[0], periods[1:]
+    first, last = _ceil(start, period), _bucket(end, period)
+    if first >= last:
+        return _sum_range(c, user, start, end, finer)
+    qry, args = _user_filter(user)
+    c.execute(
+        'SELECT coalesce(sum(amount), 0) FROM stats '
+        'WHERE period=? AND time >= ? AND time < ?' + qry,
+        (period, first, last) + args)
+    return (c.fetchone()[0] +
+            _sum_range(c, user, start, first, finer) +
+            _sum_range(c, user, last, end, finer))
+
+
 class StatisticMethods(DatabaseMethods):
 
-    def add_entry(self, user, plugin, premium, amount):
-        raise NotImplementedError
+    @async
+    def add_entry(self, user, plugin, premium, amount, ts=None):
+        """Add `amount` bytes to the buckets of every period, so the coarse
+        buckets are rolled up on write and never computed from minutes."""
+        if ts is None:
+            ts = time.time()
+        rows = [(user, plugin, int(premium), period, _bucket(ts, period))
+                for period in PERIODS]
+        self.c.executemany(
+            'INSERT OR IGNORE INTO stats '
+            '(user, plugin, premium, period, time) VALUES (?, ?, ?, ?, ?)',
+            rows)
+        self.c.executemany(
+            'UPDATE stats SET amount = amount + ?, files = files + 1 '
+            'WHERE user=? AND plugin=? AND premium=? AND period=? AND time=?',
+            [(amount,) + row for row in rows])
+
+    @async
+    def purge_stats(self, now=None):
+        """Drop the buckets that are older than their retention."""
+        if now is None:
+            now = time.time()
+        self.c.executemany(
+            'DELETE FROM stats WHERE period=? AND time < ?',
+            [(period, _bucket(now - keep, period))
+             for period, keep in RETENTION.items() if keep is not None])
+
+    @read
+    def get_traffic(self, user, start, end, period=HOUR, plugin=None):
+        """Traffic per bucket in range [`start`, `end`) as list of
+        (time, amount, files), empty buckets are left out."""
+        if period not in RETENTION:
+            raise ValueError('Invalid period {0}'.format(period))
+        qry, args = _user_filter(user)
+        if plugin is not None:
+            qry += ' AND plugin=?'
+            args += (plugin,)
+        self.c.execute(
+            'SELECT time, sum(amount), sum(files) FROM stats '
+            'WHERE period=? AND time >= ? AND time < ?' + qry +
+            ' GROUP BY time ORDER BY time',
+            (period, _bucket(start, period), end) + args)
+        return self.c.fetchall()
+
+    @read
+    def get_plugin_traffic(self, user, start, end, period=HOUR):
+        """Traffic per plugin and premium flag in range [`start`, `end`) as
+        list of (plugin, premium, amount, files)."""
+        if period not in RETENTION:
+            raise ValueError('Invalid period {0}'.format(period))
+        qry, args = _user_filter(user)
+        self.c.execute(
+            'SELECT plugin, premium, sum(amount), sum(files) FROM stats '
+            'WHERE period=? AND time >= ? AND time < ?' + qry +
+            ' GROUP BY plugin, premium ORDER BY plugin, premium',
+            (period, _bucket(start, period), end) + args)
+        return [(plugin, bool(premium), amount, files)
+                for plugin, premium, amount, files in self.c.fetchall()]
+
+    @read
+    def get_traffic_sum(self, user, start, end=None):
+        """Bytes downloaded in range [`start`, `end`), rounded to whole
+        minutes and read from the coarsest buckets that fit into it."""
+        if end is None:
+            end = time.time()
+        return _sum_range(self.c, user, _bucket(start, MINUTE),
+                          _ceil(end, MINUTE), PERIODS[::-1])
 
 
 StatisticMethods.register()
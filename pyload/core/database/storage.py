@@ -4,52 +4,62 @@
 from __future__ import absolute_import, unicode_literals
 
 from future import standard_library
-from future.builtins import object
 
-from pyload.core.database.backend import DatabaseBackend, queue
+from pyload.core.database.backend import (DatabaseMethods, async, inner,
+                                          read)
 
 standard_library.install_aliases()
 
 
-class StorageMethods(object):
-
-    @queue
-    def set_storage(self, db, identifier, key, value):
-        db.c.execute(
-            'SELECT id FROM storage WHERE identifier=? AND key=?',
-            (identifier, key))
-        if db.c.fetchone() is not None:
-            db.c.execute(
-                'UPDATE storage SET value=? WHERE identifier=? AND key=?',
-                (value, identifier, key))
-        else:
-            db.c.execute(
-                'INSERT INTO storage (identifier, key, value) '
-                'VALUES (?, ?, ?)', (identifier, key, value))
-
-    @queue
-    def get_storage(self, db, identifier, key=None):
-        if key is not None:
-            db.c.execute(
-                'SELECT value FROM storage WHERE identifier=? AND key=?',
-                (identifier, key))
-            row = db.c.fetchone()
-            if row is not None:
-                return row[0]
-        else:
-            db.c.execute(
-                'SELECT key, value FROM storage WHERE identifier=?',
-                (identifier,))
-            d = {}
-            for row in db.c:
-                d[row[0]] = row[1]
-            return d
-
-    @queue
-    def del_storage(self, db, identifier, key):
-        db.c.execute(
-            'DELETE FROM storage WHERE identifier=? AND key=?',
-            (identifier, key))
-
-
-DatabaseBackend.register_sub(StorageMethods)
+class StorageMethods(DatabaseMethods):
+
+    @inner
+    def set_storage(self, identifier, key, value):
+        """Saves `value` for `key`, None deletes the entry."""
+        self.storage.set(identifier, {key: value})
+
+    @inner
+    def set_storage_items(self, identifier, items):
+        """Saves all entries of dict `items` at once, keys with value None
+        are deleted."""
+        self.storage.set(identifier, items)
+
+    @inner
+    def get_storage(self, identifier, key=None):
+        if key is None:
+            return self.storage.get(identifier)
+        return self.storage.get(identifier, (key,)).get(key)
+
+    @inner
+    def get_storage_items(self, identifier, keys):
+        """Dict of the entries stored for `keys`, missing ones are left
+        out."""
+        return self.storage.get(identifier, keys)
+
+    @inner
+    def del_storage(self, identifier, key):
+        self.storage.delete(identifier, (key,))
+
+    @inner
+    def flush_storage(self):
+        """Write pending storage changes, done by `exit` on shutdown."""
+        self.storage.flush()
+
+    @read
+    def load_storage(self, identifier):
+        self.c.execute(
+            'SELECT key, value FROM storage WHERE identifier=?',
+            (identifier,))
+        return dict(self.c.fetchall())
+
+    @async
+    def write_storage(self, updates, deletes):
+        # primary key replaces existing entries
+        self.c.executemany(
+            'INSERT INTO storage (identifier, key, value) VALUES (?, ?, ?)',
+            updates)
+        self.c.executemany(
+            'DELETE FROM storage WHERE identifier=? AND key=?', deletes)
+
+
+StorageMethods.register()
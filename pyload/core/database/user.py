@@ -3,12 +3,10 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from hashlib import sha1
-
 import bcrypt
 from future import standard_library
 
-from pyload.core.database.backend import DatabaseMethods, async, queue
+from pyload.core.database.backend import DatabaseMethods, async, queue, read
 from pyload.core.datatype.user import UserData
 from pyload.utils.convert import to_bytes
 
@@ -38,7 +36,7 @@ class UserMethods(DatabaseMethods):
             'INSERT INTO users (uid, name, password) VALUES (?, ?, ?)',
             (uid, 'debugUser', bcrypt.gensalt()))
 
-    @queue
+    @read
     def get_user_data(self, name=None, uid=None, role=None):
         qry = (
             'SELECT uid, name, email, role, permission, folder, traffic, '
@@ -64,7 +62,7 @@ class UserMethods(DatabaseMethods):
 
         return
 
-    @queue
+    @read
     def get_all_user_data(self):
         self.c.execute(
             'SELECT uid, name, email, role, permission, folder, traffic, '
@@ -75,7 +73,7 @@ class UserMethods(DatabaseMethods):
 
         return user
 
-    @queue
+    @read
     def check_auth(self, user, password):
         self.c.execute(
             'SELECT uid, name, email, role, permission, folder, traffic, '
@@ -84,10 +82,8 @@ class UserMethods(DatabaseMethods):
         r = self.c.fetchone()
         if not r:
             return
-        salt = r[-1][:5]
-        pw = r[-1][5:]
-        h = sha1(salt + password)
-        if h.hexdigest() == pw:
+        # hashed by `add_user`
+        if bcrypt.checkpw(to_bytes(password), r[-1]):
             return UserData(*r[:-1])
         else:
             return
@@ -109,7 +105,24 @@ class UserMethods(DatabaseMethods):
 
         return False
 
-    # TODO: update methods
+    @queue
+    def update_user(self, data):
+        self.c.execute(
+            'UPDATE users SET email=?, role=?, permission=?, folder=?, '
+            'traffic=?, dllimit=?, dlquota=?, hddquota=?, template=? '
+            'WHERE uid=?',
+            (data.email, data.role, data.permission, data.folder,
+             data.traffic, data.dllimit, data.dlquota, data.hddquota,
+             data.templatename, data.uid))
+
+    @queue
+    def remove_user(self, uid):
+        """Deletes user and all associated accounts, returns their uids."""
+        self.c.execute('SELECT uid FROM users WHERE user=?', (uid,))
+        uids = [r[0] for r in self.c.fetchall()]
+        self.c.execute('DELETE FROM users WHERE user=?', (uid,))
+        return uids
+
     @async
     def remove_user_by_name(self, name):
         self.c.execute('SELECT uid FROM users WHERE name=?', (name,))
@@ -291,6 +291,16 @@ class EventInfo(BaseObject):
         self.event_args = event_args
 
 
+class FilePage(BaseObject):
+
+    __slots__ = ['files', 'cursor']
+
+    def __init__(self, files=None, cursor=None):
+        super(FilePage, self).__init__()
+        self.files = files
+        self.cursor = cursor
+
+
 class Input(BaseObject):
 
     __slots__ = ['type', 'default', 'data']
@@ -318,6 +328,28 @@ class LinkStatus(BaseObject):
         self.hash = hash
 
 
+class PackagePage(BaseObject):
+
+    __slots__ = ['packages', 'cursor']
+
+    def __init__(self, packages=None, cursor=None):
+        super(PackagePage, self).__init__()
+        self.packages = packages
+        self.cursor = cursor
+
+
+class PluginTraffic(BaseObject):
+
+    __slots__ = ['plugin', 'premium', 'amount', 'files']
+
+    def __init__(self, plugin=None, premium=None, amount=None, files=None):
+        super(PluginTraffic, self).__init__()
+        self.plugin = plugin
+        self.premium = premium
+        self.amount = amount
+        self.files = files
+
+
 class ProgressInfo(BaseObject):
 
     __slots__ = ['plugin', 'name', 'statusmsg', 'eta',
@@ -361,6 +393,17 @@ class StatusInfo(BaseObject):
         self.quota = quota
 
 
+class TrafficInfo(BaseObject):
+
+    __slots__ = ['time', 'amount', 'files']
+
+    def __init__(self, time=None, amount=None, files=None):
+        super(TrafficInfo, self).__init__()
+        self.time = time
+        self.amount = amount
+        self.files = files
+
+
 class TreeCollection(BaseObject):
 
     __slots__ = ['root', 'files', 'packages']
@@ -371,3 +414,20 @@ class TreeCollection(BaseObject):
         self.root = root
         self.files = files
         self.packages = packages
+
+
+class TreeDelta(BaseObject):
+
+    __slots__ = ['version', 'full', 'files', 'packages', 'deleted_files',
+                 'deleted_packages']
+
+    def __init__(self, version=None, full=None, files=None, packages=None,
+                 deleted_files=None, deleted_packages=None):
+        super(TreeDelta, self).__init__()
+
+        self.version = version
+        self.full = full
+        self.files = files
+        self.packages = packages
+        self.deleted_files = deleted_files
+        self.deleted_packages = deleted_packages
@@ -43,6 +43,7 @@ classes = {
     'FileDoesNotExist': [int],
     'FileInfo':
         [int, str, int, int, int, int, int, int, int, (None, DownloadInfo)],
+    'FilePage': [(list, FileInfo), (None, str)],
     'Input': [int, (None, str), (None, str)],
     'InteractionTask': [int, int, Input, str, str, str],
     'InvalidConfigSection': [str],
@@ -52,14 +53,20 @@ classes = {
     'PackageInfo':
         [int, str, str, int, int, str, str, str, int, (list, str), int, bool,
          int, PackageStats, (list, int), (list, int)],
+    'PackagePage': [(list, PackageInfo), (None, str)],
     'PackageStats': [int, int, int, int],
+    'PluginTraffic': [str, bool, int, int],
     'ProgressInfo':
         [str, str, str, int, int, int, int, int, (None, DownloadProgress)],
     'ServiceDoesNotExist': [str, str],
     'ServiceException': [str],
     'StatusInfo': [int, int, int, int, int, bool, bool, bool, bool, int],
+    'TrafficInfo': [int, int, int],
     'TreeCollection':
         [PackageInfo, (dict, int, FileInfo), (dict, int, PackageInfo)],
+    'TreeDelta':
+        [int, bool, (dict, int, FileInfo), (dict, int, PackageInfo),
+         (list, int), (list, int)],
     'UserData': [int, str, str, int, int, str, int, int, str, int, int, str],
     'UserDoesNotExist': [str]
 }
@@ -71,14 +78,17 @@ methods = {
     'add_package_child': int,
     'add_packagep': int,
     'add_user': UserData,
+    'backup_database': None,
     'check_container': OnlineCheck,
     'check_html': OnlineCheck,
     'check_links': OnlineCheck,
     'create_account': AccountInfo,
     'create_package': int,
+    'create_session': str,
     'delete_config': None,
     'delete_files': bool,
     'delete_packages': bool,
+    'end_session': None,
     'find_files': TreeCollection,
     'find_packages': TreeCollection,
     'free_space': int,
@@ -95,7 +105,9 @@ methods = {
     # 'get_config': (dict, str, ConfigHolder),
     'get_config_value': str,
     # 'get_core_config': (list, ConfigInfo),
+    'get_database_stats': dict,
     'get_file_info': FileInfo,
+    'get_file_page': FilePage,
     'get_file_tree': TreeCollection,
     'get_filtered_file_tree': TreeCollection,
     'get_filtered_files': TreeCollection,
@@ -104,11 +116,15 @@ methods = {
     'get_log': (list, str),
     'get_package_content': TreeCollection,
     'get_package_info': PackageInfo,
+    'get_package_page': PackagePage,
     # 'get_plugin_config': (list, ConfigInfo),
+    'get_plugin_traffic': (list, PluginTraffic),
     'get_progress_info': (list, ProgressInfo),
     'get_quota': int,
     'get_server_version': str,
     'get_status_info': StatusInfo,
+    'get_traffic': (list, TrafficInfo),
+    'get_tree_delta': TreeDelta,
     'get_user_data': UserData,
     'get_ws_address': str,
     'invoke_addon': str,
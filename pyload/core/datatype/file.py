@@ -59,6 +59,27 @@ statusmap = {
     'custom': 19,
     'unknown': 20
 }
+# attributes of `File` written to the database and their columns
+file_columns = {
+    '_name': 'name',
+    '_size': 'size',
+    'filestatus': 'status',
+    'media': 'media',
+    'url': 'url',
+    'hash': 'hash',
+    'status': 'dlstatus',
+    'error': 'error',
+}
+# download states written at once instead of with the next batch
+final_status = (DownloadStatus.Offline, DownloadStatus.Finished,
+                DownloadStatus.Skipped, DownloadStatus.Failed,
+                DownloadStatus.TempOffline, DownloadStatus.Aborted,
+                DownloadStatus.NotPossible, DownloadStatus.Missing,
+                DownloadStatus.FileMismatch)
+# download states of the files picked as jobs, leaving or entering them is
+# written at once as well
+job_status = (DownloadStatus.Online, DownloadStatus.Queued,
+              DownloadStatus.Occupied)
 filetypes = {
     MediaType.Audio: re.compile(
         r'\.(m3u|m4a|mp3|wav|wma|aac?|flac|midi|m4b)$', flags=re.I),
@@ -122,23 +143,22 @@ class FileInfo(BaseObject):
 
 class File(BaseObject):
     """Represents a file object at runtime."""
-    __slots__ = ['_name', '_size', 'abort', 'added', 'error', 'fid',
+    __slots__ = ['_name', '_size', 'abort', 'added', 'dirty', 'error', 'fid',
                  'fileorder', 'filestatus', 'hash', 'lock', 'manager', 'media',
                  'owner', 'packageid', 'plugin', 'pluginclass', 'pluginname',
-                 'reconnected', 'status', 'statusname', 'url', 'wait_until']
+                 'pyload', 'reconnected', 'status', 'statusname', 'url',
+                 'wait_until']
 
     @staticmethod
     def from_info_data(m, info):
-        file = File(m, info.fid, info.name, info.size, info.status, info.media,
-                    info.added, info.fileorder, '', '', '', DownloadStatus.NA,
-                    '', info.package, info.owner)
-        if info.download:
-            file.url = info.download.url
-            file.pluginname = info.download.plugin
-            file.hash = info.download.hash
-            file.status = info.download.status
-            file.error = info.download.error
-        return file
+        dl = info.download
+        if dl is None:
+            return File(m, info.fid, info.name, info.size, info.status,
+                        info.media, info.added, info.fileorder, '', '', '',
+                        DownloadStatus.NA, '', info.package, info.owner)
+        return File(m, info.fid, info.name, info.size, info.status, info.media,
+                    info.added, info.fileorder, dl.url, dl.plugin, dl.hash,
+                    dl.status, dl.error, info.package, info.owner)
 
     def __init__(
         self, manager, fid, name, size, filestatus, media, added,
@@ -175,10 +195,24 @@ class File(BaseObject):
         self.reconnected = False
         self.statusname = None
 
+        # attributes changed since the last write, see `file_columns`
+        self.dirty = set()
+
+    def __setattr__(self, name, value):
+        if (name in file_columns and hasattr(self, 'dirty') and
+                getattr(self, name) != value):
+            super(File, self).__setattr__(name, value)
+            self.manager.mark_dirty(self, name)
+        else:
+            super(File, self).__setattr__(name, value)
+
     def get_size(self):
         """Get size of download."""
-        if self.plugin.dl.size is not None:
-            self.self._size(self.plugin.dl.size)
+        try:
+            if self.plugin.dl.size is not None:
+                self._size = self.plugin.dl.size
+        except Exception:
+            pass
         return self._size
 
     # NOTE: convert size to int
@@ -203,7 +237,8 @@ class File(BaseObject):
         # media type is updated if needed
         if self._name != name:
             self.media = guess_type(name)
-            self._name = name
+            old, self._name = self._name, name
+            self.manager.file_renamed(self, old)
 
     name = property(get_name, set_name)
 
@@ -230,9 +265,12 @@ class File(BaseObject):
         return self.manager.get_package(self.packageid)
 
     def set_status(self, status):
-        self.status = statusmap[status]
-        # needs to sync so status is written to database
-        self.sync()
+        old, self.status = self.status, statusmap[status]
+        # progress states, like waiting and downloading, are written with
+        # the next batch
+        if (self.status in final_status or self.status in job_status or
+                old in job_status):
+            self.sync()
 
     def set_custom_status(self, msg, status='processing'):
         self.statusname = msg
@@ -248,7 +286,7 @@ class File(BaseObject):
         return statusmap[status] == self.status
 
     def sync(self):
-        """Sync File instance with database."""
+        """Write the changed attributes to the database at once."""
         self.manager.update_file(self)
 
     @lock
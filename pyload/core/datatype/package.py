@@ -78,10 +78,14 @@ class PackageStats(BaseObject):
 
 class Package(BaseObject):
     """Represents a package object at runtime."""
-    __slots__ = ['added', 'comment', 'comment', 'folder', 'manager', 'name',
-                 'ownerid', 'packageorder', 'password', 'password', 'pid',
-                 'root', 'set_finished', 'shared', 'site', 'site', 'status',
-                 'tags', 'timestamp']
+    __slots__ = ['added', 'comment', 'comment', 'dirty', 'folder', 'manager',
+                 'name', 'ownerid', 'packageorder', 'password', 'password',
+                 'pid', 'pyload', 'root', 'set_finished', 'shared', 'site',
+                 'site', 'status', 'tags', 'timestamp']
+
+    # attributes written by `sync`
+    COLUMNS = ('name', 'folder', 'site', 'comment', 'password', 'tags',
+               'status', 'shared')
 
     @staticmethod
     def from_info_data(m, info):
@@ -116,8 +120,17 @@ class Package(BaseObject):
         # Finish event already fired
         self.set_finished = False
 
+        # attributes changed since the last write
+        self.dirty = False
+
+    def __setattr__(self, name, value):
+        if name in self.COLUMNS and getattr(self, name, value) != value:
+            super(Package, self).__setattr__('dirty', True)
+        super(Package, self).__setattr__(name, value)
+
     def is_stale(self):
-        return self.timestamp + 30 * 60 > time.time()
+        """Not used for 30 minutes."""
+        return self.timestamp + 30 * 60 < time.time()
 
     def to_info_data(self):
         return PackageInfo(
@@ -142,11 +155,13 @@ class Package(BaseObject):
 
     def sync(self):
         """Sync with db."""
+        self.dirty = False
         self.manager.update_package(self)
 
     def release(self):
         """Sync and delete from cache."""
-        self.sync()
+        if self.dirty:
+            self.sync()
         self.manager.release_package(self.id)
 
     def delete(self):
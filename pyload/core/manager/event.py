@@ -31,6 +31,8 @@ class EventManager(BaseManager):
     download:allFinished                   All downloads in the queue are
                                            finished.
     config:changed        sec, opt, value  The config was changed.
+    user:updated          uid              Data of a user was changed.
+    user:deleted          uid              A user was removed.
     ===================== ================ ====================================
 
     | Notes:
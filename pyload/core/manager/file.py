@@ -4,37 +4,80 @@
 from __future__ import absolute_import, unicode_literals
 
 import time
-from functools import reduce
+from collections import deque
 
 from future import standard_library
 from future.builtins import dict
 
-from pyload.core.datatype.base import DownloadStatus, TreeCollection
-from pyload.core.datatype.file import File
+from pyload.core.datatype.base import (DownloadState, DownloadStatus,
+                                       FilePage, PackagePage, TreeCollection,
+                                       TreeDelta)
+from pyload.core.datatype.file import File, file_columns
 from pyload.core.datatype.package import (Package, PackageDoesNotExist,
                                           PackageStatus, RootPackage)
 from pyload.core.manager.base import BaseManager
+from pyload.utils.layer.legacy.collections import OrderedDict
+from pyload.utils.layer.safethreading import Lock
 from pyload.utils.struct.lock import RWLock, lock
 
 standard_library.install_aliases()
 
 
-# invalidates the cache
+# invalidates the job cache, the counters are maintained by the database
 def invalidate(func):
     def new(*args):
-        args[0].downloadstats = {}
-        args[0].queuestats = {}
         args[0].job_cache = {}
         return func(*args)
 
     return new
 
 
+_zero_stats = (0, 0, 0, 0, 0, 0)
+
+# files in these states are held by a thread and never evicted
+_busy_status = (DownloadStatus.Starting, DownloadStatus.Waiting,
+                DownloadStatus.Downloading, DownloadStatus.Decrypting,
+                DownloadStatus.Processing)
+
+
+def _index_add(index, key, value):
+    index.setdefault(key, set()).add(value)
+
+
+def _index_remove(index, key, value):
+    values = index.get(key)
+    if values is None:
+        return
+    values.discard(value)
+    if not values:
+        del index[key]
+
+
+def _encode_cursor(parent, order):
+    return '{0:d}:{1:d}'.format(parent, order)
+
+
+def _decode_cursor(cursor):
+    """(parent, order) from a cursor of a previous page."""
+    if not cursor:
+        return None
+    parent, order = cursor.split(':')
+    return int(parent), int(order)
+
+
 class FileManager(BaseManager):
     """Handles all request made to obtain information, modify status or other
     request for links or packages."""
     ROOT_PACKAGE = -1
     ROOT_OWNER = -1
+    # seconds the download and queue counters are reused
+    STATS_INTERVAL = 1
+    # number of changes kept for `get_tree_delta`
+    CHANGE_LOG_SIZE = 1000
+    # seconds between the checks for stale packages
+    EVICT_INTERVAL = 60
+    # seconds changed files are collected before they are written
+    FLUSH_INTERVAL = 2
 
     def setup(self):
         # translations
@@ -61,8 +104,29 @@ class FileManager(BaseManager):
             self._('custom'),
             self._('unknown')]
 
-        self.files = {}  # holds instances for files
-        self.packages = {}  # same for packages
+        # holds instances for files and packages, least recently used first
+        self.files = OrderedDict()
+        self.packages = OrderedDict()
+        # instances of each kind kept before the least recently used are
+        # released
+        self.cache_size = self.pyload.config.get('general', 'cache_size')
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.evict_time = time.time() + self.EVICT_INTERVAL
+
+        # files with attributes not written yet, changed by any thread
+        self.dirty_files = OrderedDict()
+        self.dirty_lock = Lock()
+        self.flush_time = time.time() + self.FLUSH_INTERVAL
+
+        # indexes of the cached instances, so lookups by package, root or
+        # name do not scan the whole cache
+        self.package_files = {}  # pid -> fids
+        self.root_packages = {}  # root -> pids
+        self.named_files = {}  # name -> fids
+        # names are changed by the plugins outside of the cache lock
+        self.name_lock = Lock()
 
         self.job_cache = {}
 
@@ -70,8 +134,14 @@ class FileManager(BaseManager):
         self.lock = RWLock()
         # self.lock._Verbose__verbose = True
 
-        self.downloadstats = {}  # cached dl stats
-        self.queuestats = {}  # cached queue stats
+        self.stats = {}  # owner -> counters of `db.get_owner_stats`
+        self.stats_time = 0
+
+        # one (version, pids, fids, pids with all files) entry per change,
+        # versions of earlier runs are smaller than the start and outdated
+        self.version = int(time.time() * 1000)
+        self.changes = deque(maxlen=self.CHANGE_LOG_SIZE)
+        self.change_lock = Lock()
 
         self.db = self.pyload.db
 
@@ -82,20 +152,149 @@ class FileManager(BaseManager):
     @lock(shared=True)
     def sync_save(self):
         """Saves all data to backend and waits until all data are written."""
-        for file in self.files.values():
-            file.sync()
+        self.flush()
 
-        for pack in self.packages.values():
-            pack.sync()
+        for pack in self.cached_packages():
+            if pack.dirty:
+                pack.sync()
 
         self.db.sync_save()
 
+    def mark_dirty(self, file, name):
+        """Called by `File` when its attribute `name` changed."""
+        with self.dirty_lock:
+            file.dirty.add(name)
+            self.dirty_files[file.fid] = file
+
+    def _pop_changes(self, files):
+        """List of (file, dict of column -> value) of the changed attributes
+        of `files`, which are clean afterwards."""
+        changes = []
+        with self.dirty_lock:
+            for file in files:
+                self.dirty_files.pop(file.fid, None)
+                if not file.dirty:
+                    continue
+                changes.append((file, dict(
+                    (file_columns[name], getattr(file, name))
+                    for name in file.dirty)))
+                file.dirty = set()
+        return changes
+
+    def _write_changes(self, changes):
+        if not changes:
+            return
+        self.job_cache = {}
+        self.db.update_files(
+            [(file.fid, columns) for file, columns in changes])
+        # the package stats depend on the file status
+        self.changed(packages=set(file.packageid for file, _ in changes),
+                     files=[file.fid for file, _ in changes])
+
+        # This event is thrown with file or only fid
+        for file, _ in changes:
+            self.pyload.evm.fire('file:updated', file)
+
+    def flush(self):
+        """Writes the changed attributes of all files in one batch."""
+        with self.dirty_lock:
+            files = list(self.dirty_files.values())
+        self._write_changes(self._pop_changes(files))
+
     def cached_files(self):
         return list(self.files.values())
 
     def cached_packages(self):
         return list(self.packages.values())
 
+    def get_cache_stats(self):
+        """Size and hit, miss and eviction counters of the instance cache."""
+        return {
+            'files': len(self.files),
+            'packages': len(self.packages),
+            'size': self.cache_size,
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'evictions': self.cache_evictions,
+        }
+
+    @lock
+    def work(self):
+        """Writes the changed files and releases stale packages, called
+        periodically by the core."""
+        now = time.time()
+        if self.flush_time <= now:
+            self.flush_time = now + self.FLUSH_INTERVAL
+            self.flush()
+        if self.evict_time <= now:
+            self.evict_time = now + self.EVICT_INTERVAL
+            self._evict(stale=True)
+
+    def _evictable_file(self, file):
+        return (file.plugin is None and not file.dirty and
+                file.status not in _busy_status)
+
+    def _evictable_package(self, pack):
+        # the finished flag lives on the instance of a package in use,
+        # changes not synced yet would be lost
+        return not pack.dirty and pack.pid not in self.package_files
+
+    def _evict(self, stale=False):
+        """Releases the least recently used instances while more than
+        `cache_size` of a kind are cached, with `stale` also the packages
+        not used for a while."""
+        excess = len(self.files) - self.cache_size
+        for fid, file in list(self.files.items()):
+            if excess <= 0:
+                break
+            if self._evictable_file(file):
+                self.release_file(fid)
+                self.cache_evictions += 1
+                excess -= 1
+
+        excess = len(self.packages) - self.cache_size
+        for pid, pack in list(self.packages.items()):
+            if excess <= 0 and not stale:
+                break
+            if ((excess > 0 or pack.is_stale()) and
+                    self._evictable_package(pack)):
+                self.release_package(pid)
+                self.cache_evictions += 1
+                excess -= 1
+
+    def cached_package_files(self, pid):
+        """Cached files of package `pid`."""
+        fids = list(self.package_files.get(pid, ()))
+        return [self.files[fid] for fid in fids if fid in self.files]
+
+    def cached_named_files(self, name):
+        """Cached files with the name `name`."""
+        with self.name_lock:
+            fids = list(self.named_files.get(name, ()))
+        return [self.files[fid] for fid in fids if fid in self.files]
+
+    def _cache_file(self, file):
+        self.files[file.fid] = file
+        _index_add(self.package_files, file.packageid, file.fid)
+        with self.name_lock:
+            _index_add(self.named_files, file._name, file.fid)
+        if len(self.files) > self.cache_size:
+            self._evict()
+
+    def _cache_package(self, pack):
+        self.packages[pack.pid] = pack
+        _index_add(self.root_packages, pack.root, pack.pid)
+        if len(self.packages) > self.cache_size:
+            self._evict()
+
+    def file_renamed(self, file, old):
+        """Updates the name index, called by `File.set_name`."""
+        with self.name_lock:
+            if self.files.get(file.fid) is not file:
+                return
+            _index_remove(self.named_files, old, file.fid)
+            _index_add(self.named_files, file._name, file.fid)
+
     def get_collector(self):
         raise NotImplementedError
 
@@ -105,6 +304,7 @@ class FileManager(BaseManager):
         Add links, data = (url, plugin) tuple. Internal method should use API.
         """
         self.db.add_links(data, pid, owner)
+        self.changed(packages=[pid], contents=[pid])
         self.pyload.evm.fire('package:updated', pid)
 
     @invalidate
@@ -116,6 +316,7 @@ class FileManager(BaseManager):
             if paused else PackageStatus.Ok, owner)
         pinfo = self.db.get_package_info(pid)
 
+        self.changed(packages=[pid, pinfo.root])
         self.pyload.evm.fire('package:inserted', pid,
                              pinfo.root, pinfo.packageorder)
         return pid
@@ -126,16 +327,20 @@ class FileManager(BaseManager):
         if pid == self.ROOT_PACKAGE:
             return RootPackage(self, self.ROOT_OWNER)
         elif pid in self.packages:
-            pack = self.packages[pid]
+            # most recently used
+            pack = self.packages.pop(pid)
+            self.packages[pid] = pack
             pack.timestamp = time.time()
+            self.cache_hits += 1
             return pack
         else:
+            self.cache_misses += 1
             info = self.db.get_package_info(pid, False)
             if not info:
                 return
 
             pack = Package.from_info_data(self, info)
-            self.packages[pid] = pack
+            self._cache_package(pack)
 
             return pack
 
@@ -169,14 +374,19 @@ class FileManager(BaseManager):
     def get_file(self, fid):
         """Returns file instance."""
         if fid in self.files:
-            return self.files[fid]
+            # most recently used
+            file = self.files.pop(fid)
+            self.files[fid] = file
+            self.cache_hits += 1
+            return file
         else:
+            self.cache_misses += 1
             info = self.db.get_file_info(fid)
             if not info:
                 return
 
             f = File.from_info_data(self, info)
-            self.files[fid] = f
+            self._cache_file(f)
             return f
 
     @lock(shared=True)
@@ -186,20 +396,66 @@ class FileManager(BaseManager):
             return self.files[fid].to_info_data()
         return self.db.get_file_info(fid)
 
-    def _get_tree_files(self, root, state, owner):
-        files = self.db.get_all_files(
-            package=root, state=state, owner=owner)
+    def _get_tree_files(self, root, state, owner, search=None, tree=None):
+        files = self.db.get_all_files(package=root, search=search,
+                                      state=state, owner=owner, tree=tree)
         # updating from cache
-        for fid, file in self.files.items():
-            if fid not in files:
+        if root is not None:
+            cached = self.cached_package_files(root)
+        elif tree is not None or len(files) < len(self.files):
+            cached = [self.files[fid] for fid in files if fid in self.files]
+        else:
+            cached = self.cached_files()
+        for file in cached:
+            if file.fid not in files:
                 continue
-            files[fid] = file.to_info_data()
+            files[file.fid] = file.to_info_data()
         return files
 
-    def _get_tree_packages(self, root, owner):
-        packs = self.db.get_all_packages(root, owner=owner)
+    @lock(shared=True)
+    def get_file_page(self, limit, cursor=None, state=None, owner=None):
+        """Return a FilePage with at most `limit` files following `cursor`,
+        ordered by package and position."""
+        files = self.db.get_files_page(
+            _decode_cursor(cursor), limit, state=state, owner=owner)
+        cursor = None
+        if len(files) == limit:
+            cursor = _encode_cursor(files[-1].package, files[-1].fileorder)
+        # updating from cache
+        for i, finfo in enumerate(files):
+            if finfo.fid in self.files:
+                files[i] = self.files[finfo.fid].to_info_data()
+        return FilePage(files, cursor)
+
+    @lock(shared=True)
+    def get_package_page(self, root, limit, cursor=None, owner=None):
+        """Return a PackagePage with at most `limit` child packages of
+        `root` following `cursor`, ordered by position."""
+        packs = self.db.get_packages_page(
+            _decode_cursor(cursor), limit, root, owner)
+        cursor = None
+        if len(packs) == limit:
+            cursor = _encode_cursor(packs[-1].root, packs[-1].packageorder)
+        for i, pinfo in enumerate(packs):
+            if pinfo.pid in self.packages:
+                packs[i] = self.packages[pinfo.pid].to_info_data()
+                packs[i].stats = pinfo.stats
+        return PackagePage(packs, cursor)
+
+    def _get_tree_packages(self, root, owner, tree=None):
+        packs = self.db.get_all_packages(root, owner=owner, tree=tree)
+        if tree is not None:
+            cached = [(fpid, self.packages[fpid]) for fpid in packs
+                      if fpid in self.packages]
+        elif root is None:
+            cached = self.packages.items()
+        else:
+            pids = set(self.root_packages.get(root, ()))
+            pids.add(root)
+            cached = [(fpid, self.packages[fpid]) for fpid in pids
+                      if fpid in self.packages]
         # foreign pid, do not overwrite local pid !
-        for fpid, pack in self.packages.items():
+        for fpid, pack in cached:
             if fpid not in packs:
                 continue
             # copy the stats data
@@ -208,24 +464,6 @@ class FileManager(BaseManager):
             packs[fpid].stats = stats
         return packs
 
-    def _reduce_tree(self, pid, packs, files):
-        keep = []
-        queue = [pid]
-        while queue:
-            fpid = queue.pop()
-            keep.append(fpid)
-            queue.extend(packs[fpid].pids)
-        # now remove unneeded data
-        for fpid in packs:
-            if fpid in keep:
-                continue
-            del packs[fpid]
-        for fid, file in files.items():
-            if file.package in keep:
-                continue
-            del files[fid]
-        return packs, files
-
     def _sanitize_tree(self, packs, files):
         # linear traversal over all data
         for fpid, pack in packs.items():
@@ -249,20 +487,22 @@ class FileManager(BaseManager):
         return packs, files
 
     @lock(shared=True)
-    def get_tree(self, pid, full, state, owner=None):
+    def get_tree(self, pid, full, state, owner=None, search=None):
         """Return a TreeCollection and fill the info data of containing
         packages.
 
-        Optional filter only unfinished files.
+        Optional filter only unfinished files or files matching search.
 
         """
         view = TreeCollection(pid)
 
-        # for depth=1, we do not need to retrieve all files/packages
+        # for depth=1, we do not need to retrieve all files/packages, the
+        # full tree of a package is queried as subtree
         root = pid if not full else None
+        tree = pid if full and pid != self.ROOT_PACKAGE else None
 
-        packs = self._get_tree_packages(root, owner)
-        files = self._get_tree_files(root, state, owner)
+        packs = self._get_tree_packages(root, owner, tree)
+        files = self._get_tree_files(root, state, owner, search, tree)
 
         # root package is not in database, create an instance
         if pid == self.ROOT_PACKAGE:
@@ -275,11 +515,6 @@ class FileManager(BaseManager):
 
         self._sanitize_tree(packs, files)
 
-        # cutting of tree is not good in runtime, only saves bandwidth
-        # need to remove some entries
-        if full and pid > -1:
-            self._reduce_tree(pid, packs, files)
-
         # remove root
         del packs[pid]
 
@@ -287,6 +522,90 @@ class FileManager(BaseManager):
         view.packages = packs
         return view
 
+    @lock(shared=True)
+    def find_packages(self, tags, owner=None, match_all=True):
+        """Return a TreeCollection of the packages tagged with all of
+        `tags`, or any of them if `match_all` is false."""
+        view = TreeCollection(self.ROOT_PACKAGE)
+        view.root = RootPackage(self, self.ROOT_OWNER).to_info_data()
+
+        packs = self.db.find_packages(tags, owner, match_all)
+        for fpid, pack in self.packages.items():
+            if fpid not in packs:
+                continue
+            stats = packs[fpid].stats
+            packs[fpid] = pack.to_info_data()
+            packs[fpid].stats = stats
+
+        view.files = {}
+        view.packages = packs
+        return view
+
+    def changed(self, packages=(), files=(), contents=()):
+        """Records a change of the info of `packages` and `files` and of all
+        files of the packages in `contents`."""
+        with self.change_lock:
+            self.version += 1
+            self.changes.append(
+                (self.version, tuple(packages), tuple(files), tuple(contents)))
+
+    def changed_all(self):
+        """Records a change that can not be tracked per item, every client
+        gets the whole tree with its next delta."""
+        with self.change_lock:
+            self.version += 1
+            self.changes.clear()
+
+    @lock(shared=True)
+    def get_tree_delta(self, since, owner=None):
+        """Return a TreeDelta with the packages and files changed after
+        version `since`.
+
+        Packages and files that do not exist anymore are listed as deleted,
+        the files of a deleted package are not listed. When the changes are
+        not known anymore, the whole tree is returned with `full` set.
+
+        """
+        # writes recorded so far may still wait for their batch to commit
+        self.db.wait_lane(self.db.DEFAULT)
+        with self.change_lock:
+            version = self.version
+            changes = [c for c in self.changes if c[0] > since]
+            known = version - len(self.changes) <= since <= version
+
+        if not known:
+            view = self.get_tree(
+                self.ROOT_PACKAGE, True, DownloadState.All, owner)
+            return TreeDelta(version, True, view.files, view.packages, [], [])
+
+        pids, fids, contents = set(), set(), set()
+        for _, packages, files, content in changes:
+            pids.update(packages)
+            fids.update(files)
+            contents.update(content)
+        pids.discard(self.ROOT_PACKAGE)
+        contents.discard(self.ROOT_PACKAGE)
+
+        delta = TreeDelta(version, False, {}, {}, [], [])
+        for pid in sorted(pids):
+            pinfo = self.get_package_info(pid)
+            if pinfo is None:
+                delta.deleted_packages.append(pid)
+            elif owner is None or pinfo.owner == owner:
+                delta.packages[pid] = pinfo
+        for pid in sorted(contents):
+            delta.files.update(self._get_tree_files(
+                pid, DownloadState.All, owner))
+        for fid in sorted(fids):
+            if fid in delta.files:
+                continue
+            finfo = self.get_file_info(fid)
+            if finfo is None:
+                delta.deleted_files.append(fid)
+            elif owner is None or finfo.owner == owner:
+                delta.files[fid] = finfo
+        return delta
+
     @lock
     def get_jobs(self, occ):
         # load jobs with file info
@@ -296,20 +615,30 @@ class FileManager(BaseManager):
                 for k, fid in self.db.get_jobs(occ).items())
         return self.job_cache[occ]
 
+    def get_stats(self, user=None, force=False):
+        """Counters of the files of `user` or all users, reloaded at most
+        every `STATS_INTERVAL` seconds.
+
+        :return: links, size, links queued, size queued, links to process
+            and size to process
+
+        """
+        now = time.time()
+        if force or self.stats_time + self.STATS_INTERVAL < now:
+            self.stats = self.db.get_owner_stats()
+            self.stats_time = now
+        if user is not None:
+            return self.stats.get(user, _zero_stats)
+        return tuple(sum(x) for x in zip(_zero_stats, *self.stats.values()))
+
     def get_download_stats(self, user=None):
         """Return number of downloads."""
-        if user not in self.downloadstats:
-            self.downloadstats[user] = self.db.downloadstats(user)
-
-        return self.downloadstats[user]
+        return self.get_stats(user)[:2]
 
     def get_queue_stats(self, user=None, force=False):
         """Number of files that have to be processed, failed files will not be
         included."""
-        if user not in self.queuestats or force:
-            self.queuestats[user] = self.db.queuestats(user)
-
-        return self.queuestats[user]
+        return self.get_stats(user, force)[2:4]
 
     def scan_download_folder(self):
         raise NotImplementedError
@@ -322,20 +651,20 @@ class FileManager(BaseManager):
         if not pack:
             return
 
-        oldorder = pack.packageorder
-        root = pack.root
-
-        for file in self.cached_files():
-            if file.packageid == pid:
+        files = self.cached_package_files(pid)
+        processing = self.pyload.tsm.processing_ids()
+        for file in files:
+            if file.fid in processing:
                 file.abort_download()
 
         self.db.delete_package(pid)
+        # deleted with the package, their pending changes are dropped
+        self._pop_changes(files)
+        for file in files:
+            self.release_file(file.fid)
         self.release_package(pid)
 
-        for pack in self.cached_packages():
-            if pack.root == root and pack.packageorder > oldorder:
-                pack.packageorder -= 1
-
+        self.changed(packages=[pid, pack.root])
         self.pyload.evm.fire('package:deleted', pid)
 
     @lock
@@ -347,61 +676,73 @@ class FileManager(BaseManager):
             return
 
         pid = file.packageid
-        order = file.fileorder
 
         if fid in self.pyload.tsm.processing_ids():
             file.abort_download()
 
-        self.db.delete_file(fid, file.fileorder, file.packageid)
+        self.db.delete_file(fid)
+        # the row is gone, pending changes are dropped
+        self._pop_changes([file])
         self.release_file(fid)
 
-        for file in self.files.values():
-            if file.packageid == pid and file.fileorder > order:
-                file.fileorder -= 1
-
+        self.changed(packages=[pid], files=[fid])
         self.pyload.evm.fire('file:deleted', fid, pid)
 
     @lock
     def release_file(self, fid):
         """Removes file from cache."""
         if fid in self.files:
-            del self.files[fid]
+            file = self.files.pop(fid)
+            self._write_changes(self._pop_changes([file]))
+            _index_remove(self.package_files, file.packageid, fid)
+            with self.name_lock:
+                _index_remove(self.named_files, file._name, fid)
 
     @lock
     def release_package(self, pid):
         """Removes package from cache."""
         if pid in self.packages:
-            del self.packages[pid]
+            pack = self.packages.pop(pid)
+            _index_remove(self.root_packages, pack.root, pid)
 
-    @invalidate
     def update_file(self, file):
-        """Updates file."""
-        self.db.update_file(file)
-
-        # This event is thrown with file or only fid
-        self.pyload.evm.fire('file:updated', file)
+        """Writes the changed attributes of file at once, without waiting for
+        the next batch."""
+        self._write_changes(self._pop_changes([file]))
 
     @invalidate
     @lock(shared=True)
     def set_download_status(self, fid, status):
         """Sets a download status for a file."""
         if fid in self.files:
-            self.files[fid].set_status(status)
+            file = self.files[fid]
+            file.set_status(status)
+            pid = file.packageid
         else:
+            finfo = self.db.get_file_info(fid)
+            if finfo is None:
+                return
             self.db.set_download_status(fid, status)
+            pid = finfo.package
 
+        self.changed(packages=[pid], files=[fid])
         self.pyload.evm.fire('file:updated', fid)
 
     @invalidate
     def update_package(self, pack):
         """Updates a package."""
         self.db.update_package(pack)
+        self.changed(packages=[pack.pid])
         self.pyload.evm.fire('package:updated', pack.pid)
 
-    @invalidate
     def update_file_info(self, data, pid):
         """Updates file info (name, size, status,[ hash,] url)."""
         self.db.update_link_info(data)
+        # written by bulk jobs, the change is only recorded once readers
+        # can see it, otherwise clients would keep the old data
+        self.db.wait_lane(self.db.BULK)
+        self.job_cache = {}
+        self.changed(packages=[pid], contents=[pid])
         self.pyload.evm.fire('package:updated', pid)
 
     def check_all_links_finished(self):
@@ -447,15 +788,15 @@ class FileManager(BaseManager):
     @invalidate
     def restart_package(self, pid):
         """Restart package."""
-        for file in self.cached_files():
-            if file.packageid == pid:
-                self.restart_file(file.fid)
+        for file in self.cached_package_files(pid):
+            self.restart_file(file.fid)
 
         self.db.restart_package(pid)
 
         if pid in self.packages:
             self.packages[pid].set_finished = False
 
+        self.changed(packages=[pid], contents=[pid])
         self.pyload.evm.fire('package:updated', pid)
 
     @lock(shared=True)
@@ -470,73 +811,38 @@ class FileManager(BaseManager):
             file.abort_download()
 
         self.db.restart_file(fid)
+        self.changed(files=[fid])
         self.pyload.evm.fire('file:updated', fid)
 
     @lock
     @invalidate
     def order_package(self, pid, position):
         pinfo = self.get_package_info(pid)
-        self.db.order_package(pid, pinfo.root, pinfo.packageorder, position)
+        orders = self.db.order_package(pid, pinfo.root, position)
 
-        for pack in self.packages.values():
-            if pack.root != pinfo.root or pack.packageorder < 0:
-                continue
-            if pack.pid == pid:
-                pack.packageorder = position
-            if (pinfo.packageorder > position and
-                    position <= pack.packageorder < pinfo.packageorder):
-                pack.packageorder += 1
-            elif (pinfo.packageorder < position and
-                  position >= pack.packageorder > pinfo.packageorder):
-                pack.packageorder -= 1
+        for fpid, order in orders.items():
+            if fpid in self.packages:
+                self.packages[fpid].packageorder = order
 
         self.db.commit()
 
+        self.changed(packages=list(orders.keys()) + [pinfo.root])
         self.pyload.evm.fire('package:reordered', pid, position, pinfo.root)
 
-    def _get_first_fileinfo(self, files):
-        # NOTE: Equality between fileorders should never happen...
-        return reduce(
-            lambda x, y: x if x.fileorder <= y.fileorder else y, files)
-
-    def _order_files(self, fids, finfo, position):
-        diff = len(fids)
-        incr = 0
-        files = (file for file in self.files.values() if not (
-            file.fileorder < 0 or file.packageid != finfo.package))
-        if finfo.fileorder > position:
-            for file in files:
-                if not (position <= file.fileorder < finfo.fileorder):
-                    continue
-                file.fileorder += diff
-            diff = 0
-        elif finfo.fileorder < position:
-            for file in files:
-                if not (position >= file.fileorder >= finfo.fileorder + diff):
-                    continue
-                file.fileorder -= diff
-            incr = 1
-        for i, fid in enumerate(fids):
-            if fid not in self.files:
-                continue
-            self.files[fid].fileorder = position - diff + i + incr
+    def _order_files(self, orders):
+        for fid, order in orders.items():
+            if fid in self.files:
+                self.files[fid].fileorder = order
 
     @lock
     @invalidate
     def order_files(self, fids, pid, position):
-        files = [self.get_file_info(fid) for fid in fids]
-        orders = (finfo.fileorder for finfo in files)
-        if min(orders) + len(files) != max(orders) + 1:
-            raise Exception('Tried to reorder non continuous block of files')
-
-        finfo = self._get_first_fileinfo(files)
+        orders = self.db.order_files(pid, fids, position)
 
-        order = finfo.fileorder  # minimum fileorder
-        self.db.order_files(pid, fids, order, position)
-
-        self._order_files(fids, finfo, position)
+        self._order_files(orders)
 
         self.db.commit()
+        self.changed(contents=[pid])
         self.pyload.evm.fire('file:reordered', pid)
 
     @lock(shared=True)
@@ -558,11 +864,12 @@ class FileManager(BaseManager):
 
         # we assume pack is not in use anyway, so we can release it
         self.release_package(pid)
-        self.db.move_package(pinfo.root, pinfo.packageorder, pid, root)
+        self.db.move_package(pid, root)
 
+        self.changed(packages=[pid, pinfo.root, root])
         return True
 
-    @lock(shared=True)
+    @lock
     @invalidate
     def move_files(self, fids, pid):
         """Move all fids to pid."""
@@ -572,8 +879,18 @@ class FileManager(BaseManager):
         if not self.get_package_info(pid):
             raise PackageDoesNotExist(pid)
 
-        self.db.move_files(finfo.package, fids, pid)
+        orders = self.db.move_files(finfo.package, fids, pid)
+
+        self._order_files(orders)
+        for fid in fids:
+            file = self.files.get(fid)
+            if file is None:
+                continue
+            _index_remove(self.package_files, file.packageid, fid)
+            file.packageid = pid
+            _index_add(self.package_files, pid, fid)
 
+        self.changed(packages=[finfo.package, pid], contents=[pid])
         return True
 
     @invalidate
@@ -599,3 +916,4 @@ class FileManager(BaseManager):
         """Restart all failed links."""
         # failed should not be in cache anymore, so working on db is sufficient
         self.db.restart_failed()
+        self.changed_all()
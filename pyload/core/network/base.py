@@ -173,6 +173,16 @@ class Base(object):
         """Same as `get_storage`."""
         return self.get_storage(*args, **kwargs)
 
+    def set_storage_items(self, items):
+        """Saves all entries of dict `items` persistently at once."""
+        self.pyload.db.set_storage_items(self.__name__, items)
+
+    def get_storage_items(self, keys, default=None):
+        """Retrieves a dict with the saved values of all keys, `default` for
+        missing ones."""
+        data = self.pyload.db.get_storage_items(self.__name__, keys)
+        return dict((key, data.get(key, default)) for key in keys)
+
     def del_storage(self, key):
         """Delete entry in db."""
         self.pyload.db.del_storage(self.__name__, key)
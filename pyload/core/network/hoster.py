@@ -405,9 +405,8 @@ class Hoster(Base):
         """
         pack = self.file.package()
 
-        for file in self.pyload.files.cached_files():
-            if file != self.file and file.name == self.file.name and file.package(
-            ).folder == pack.folder:
+        for file in self.pyload.files.cached_named_files(self.file.name):
+            if file != self.file and file.package().folder == pack.folder:
                 if file.status in (0, 12):  # finished or downloading
                     raise Skip(file.pluginname)
                 elif file.status in (
@@ -186,6 +186,13 @@ class DownloadThread(PluginThread):
             self._('Download finished: {0}').format(file.name))
         self.pyload.adm.download_finished(file)
         self.pyload.files.check_package_finished(file)
+        # the statistics must not turn a finished download into a failure
+        try:
+            self.pyload.api.record_download(file)
+        except Exception as exc:
+            self.pyload.log.error(
+                self._('Could not record download {0}: {1}').format(
+                    file.name, exc), exc_info=self.pyload.debug)
 
     def _finalize(self, file):
         self.pyload.files.save()
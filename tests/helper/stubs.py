@@ -5,6 +5,7 @@ from __future__ import absolute_import, unicode_literals
 import builtins
 import os
 import sys
+import tempfile
 import time
 from builtins import object
 from logging import DEBUG, ERROR, INFO, WARN, log
@@ -15,6 +16,7 @@ from future import standard_library
 from pyload.config import ConfigParser
 from pyload.core import Core
 from pyload.core.datatype import Role, User
+from pyload.core.manager import EventManager, FileManager
 from pyload.core.thread import PluginThread
 
 standard_library.install_aliases()
@@ -39,27 +41,52 @@ ConfigParser.save = noop
 
 class LogStub(object):
 
-    def debug(self, *args):
-        log(DEBUG, *args)
+    def debug(self, *args, **kwargs):
+        log(DEBUG, *args, **kwargs)
 
-    def info(self, *args):
-        log(INFO, *args)
+    def info(self, *args, **kwargs):
+        log(INFO, *args, **kwargs)
 
-    def error(self, *args):
-        log(ERROR, *args)
+    def error(self, *args, **kwargs):
+        log(ERROR, *args, **kwargs)
 
-    def warning(self, *args):
-        log(WARN, *args)
+    def warning(self, *args, **kwargs):
+        log(WARN, *args, **kwargs)
+
+
+class TransferManagerStub(object):
+
+    pause = True
+
+    def processing_ids(self):
+        return []
 
 
 class TestCore(Core):
+    """Core with the database and the managers used by the tests, the
+    network, plugins and addons are left out."""
 
     def __init__(self):
-        Core.__init__(self)
+        self._ = lambda x: x
+        self.cfgdir = tempfile.mkdtemp()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.cfgdir)
 
-        self.db.get_user_data = self.get_user_data
+        self.config = ConfigParser(self.DEFAULT_CONFIGNAME)
+        self.debug = True
         self.log = LogStub()
 
+        self._init_database(False)
+        self.db.get_user_data = self.get_user_data
+
+        self.eventmanager = self.evm = EventManager(self)
+        self.addonmanager = self.adm = NoopClass()
+        self.transfermanager = self.tsm = TransferManagerStub()
+        self.filemanager = self.files = FileManager(self)
+        self.db.manager = self.files
+
+        self._init_api()
+
     def get_server_version(self):
         return "TEST_RUNNER on {0}".format(time.strftime("%d %h %Y"))
 
@@ -9,7 +9,7 @@ from builtins import range
 from future import standard_library
 
 from pyload.core.database import DatabaseBackend
-from pyload.core.datatype import DownloadState
+from pyload.core.datatype import DownloadState, DownloadStatus
 from tests.helper.benchmark import BenchmarkTest
 from tests.helper.stubs import Core, normal_user
 
@@ -35,12 +35,12 @@ class TestFileManager(BenchmarkTest):
         cls.db = c.db
         cls.db.purge_all()
 
-        cls.m = cls.db.manager = c.files
+        cls.manager = cls.db.manager = c.files
 
     @classmethod
     def tearDownClass(cls):
         cls.db.purge_all()
-        cls.db.shutdown()
+        cls.db.exit()
 
     # benchmarker ignore setup
     def setUp(self):
@@ -67,7 +67,7 @@ class TestFileManager(BenchmarkTest):
                   "url {0}".format(i)) for i in range(self.count)),
                 pid, normal_user.uid)
 
-        count = self.manager.get_queue_stats()[0]
+        count = self.manager.get_queue_stats(force=True)[0]
         files = self.count * len(self.pids)
         # in test runner files get added twice
         assert count == files or count == files * 2
@@ -112,7 +112,7 @@ class TestFileManager(BenchmarkTest):
 
         assert len(view.packages) == len(self.pids)
 
-        pack = random.choice(view.packages.values())
+        pack = random.choice(list(view.packages.values()))
         assert len(pack.fids) == self.count
         assert pack.stats.linkstotal == self.count
 
@@ -135,6 +135,161 @@ class TestFileManager(BenchmarkTest):
         self.manager.remove_file(self.count * 5)
         self.manager.remove_package(random.choice(self.pids))
 
+    def test_delete_dirty(self):
+        pid = self.pids[0]
+        fids = self.manager.get_package_info(pid).fids
+        files = [self.manager.get_file(fid) for fid in fids[:3]]
+        for file in files:
+            file.error = "pending"
+
+        # pending changes of deleted files are not written anymore
+        updated = []
+        self.manager.pyload.evm.listen_to('file:updated', updated.append)
+        try:
+            self.manager.remove_file(fids[0])
+            self.manager.remove_package(pid)
+        finally:
+            self.manager.pyload.evm.remove_event(
+                'file:updated', updated.append)
+        assert not updated
+        for fid in fids[:3]:
+            assert fid not in self.manager.dirty_files
+            assert fid not in self.manager.files
+        assert not self.manager.cached_package_files(pid)
+
+    def test_cache_index(self):
+        pid, pid2 = self.pids[0], self.pids[1]
+        fids = self.manager.get_package_info(pid).fids
+        files = [self.manager.get_file(fid) for fid in fids[:5]]
+        assert set(self.manager.cached_package_files(pid)) == set(files)
+
+        files[0].name = "indexed_name"
+        assert self.manager.cached_named_files("indexed_name") == files[:1]
+
+        self.manager.move_files(fids[:2], pid2)
+        assert set(self.manager.cached_package_files(pid2)) == set(files[:2])
+        assert set(self.manager.cached_package_files(pid)) == set(files[2:])
+
+        self.manager.release_file(fids[0])
+        assert not self.manager.cached_named_files("indexed_name")
+        assert self.manager.cached_package_files(pid2) == files[1:2]
+
+    def test_cache_eviction(self):
+        size = self.manager.cache_size
+        self.manager.cache_size = 5
+        try:
+            fids = self.manager.get_package_info(self.pids[0]).fids
+            for fid in fids[:10]:
+                self.manager.get_file(fid)
+            assert list(self.manager.files.keys()) == fids[5:10]
+
+            # used again, so it is kept
+            self.manager.get_file(fids[5])
+            self.manager.get_file(fids[10])
+            assert fids[5] in self.manager.files
+            assert fids[6] not in self.manager.files
+            assert self.manager.get_cache_stats()["evictions"] >= 6
+        finally:
+            self.manager.cache_size = size
+
+    def test_cache_eviction_dirty_package(self):
+        size = self.manager.cache_size
+        self.manager.cache_size = 1
+        try:
+            pack = self.manager.get_package(self.pids[0])
+            pack.comment = "not synced"
+            for pid in self.pids[1:5]:
+                self.manager.get_package(pid)
+            self.manager._evict()
+            assert pack.pid in self.manager.packages
+
+            pack.sync()
+            self.manager.get_package(self.pids[1])
+            self.manager._evict()
+            assert pack.pid not in self.manager.packages
+            info = self.manager.get_package_info(pack.pid)
+            assert info.comment == "not synced"
+        finally:
+            self.manager.cache_size = size
+
+    def test_dirty_flush(self):
+        fid = self.manager.get_package_info(self.pids[0]).fids[0]
+        file = self.manager.get_file(fid)
+        assert not file.dirty
+
+        file.error = "pending"
+        assert file.dirty == {"error"}
+        self.db.sync_save()
+        assert self.db.get_file_info(fid).download.error != "pending"
+
+        self.manager.flush()
+        self.db.sync_save()
+        assert not file.dirty
+        assert self.db.get_file_info(fid).download.error == "pending"
+
+        # final states are written at once
+        file.set_status("failed")
+        self.db.sync_save()
+        assert not file.dirty
+        assert self.db.get_file_info(fid).download.status == file.status
+
+    def test_tree_delta(self):
+        delta = self.manager.get_tree_delta(0)
+        assert delta.full
+        assert len(delta.packages) == len(self.pids)
+
+        version = delta.version
+        assert not self.manager.get_tree_delta(version).packages
+
+        pid = self.manager.add_package(
+            "delta", "", -1, "", "", "", False, normal_user.uid)
+        self.manager.add_links((("url", "plugin") for i in range(10)), pid,
+                               normal_user.uid)
+        delta = self.manager.get_tree_delta(version)
+        assert not delta.full
+        assert list(delta.packages.keys()) == [pid]
+        assert len(delta.files) == 10
+
+        fid = list(delta.files.keys())[0]
+        self.manager.remove_file(fid)
+        delta = self.manager.get_tree_delta(delta.version)
+        assert delta.deleted_files == [fid]
+        assert list(delta.packages.keys()) == [pid]
+
+    def test_tree_delta_link_info(self):
+        pid = self.pids[0]
+        version = self.manager.get_tree_delta(0).version
+        files = [self.manager.get_file_info(fid)
+                 for fid in self.manager.get_package_info(pid).fids]
+        self.manager.update_file_info(
+            [("checked {0:d}".format(f.fid), 100, 2, f.download.url)
+             for f in files], pid)
+
+        # results are visible with the version they are announced with
+        delta = self.manager.get_tree_delta(version)
+        assert not delta.full
+        for f in files:
+            assert delta.files[f.fid].name == "checked {0:d}".format(f.fid)
+
+    def test_tree_delta_finished(self):
+        pid = self.pids[0]
+        fid = self.manager.get_package_info(pid).fids[0]
+        version = self.manager.get_tree_delta(0).version
+
+        self.manager.set_download_status(fid, DownloadStatus.Finished)
+        delta = self.manager.get_tree_delta(version)
+        assert fid in delta.files
+        assert pid in delta.packages
+        assert delta.packages[pid].stats.linksdone >= 1
+
+        version = delta.version
+        file = self.manager.get_file(fid)
+        file.set_status('queued')
+        self.manager.flush()
+        delta = self.manager.get_tree_delta(version)
+        assert fid in delta.files
+        assert pid in delta.packages
+
     def test_order_package(self):
         parent = self.manager.add_package(
             "order", "", -1, "", "", "", False, normal_user.uid)
@@ -148,12 +303,12 @@ class TestFileManager(BenchmarkTest):
         v = self.manager.get_tree(parent, False, None)
         self.assert_ordered(pids, 0, 5, v.root.pids, v.packages, True)
 
-        pid = v.packages.keys()[0]
+        pid = list(v.packages.keys())[0]
         self.assert_pack_ordered(parent, pid, 3)
         self.assert_pack_ordered(parent, pid, 0)
         self.assert_pack_ordered(parent, pid, 0)
         self.assert_pack_ordered(parent, pid, 4)
-        pid = v.packages.keys()[2]
+        pid = list(v.packages.keys())[2]
         self.assert_pack_ordered(parent, pid, 4)
         self.assert_pack_ordered(parent, pid, 3)
         self.assert_pack_ordered(parent, pid, 2)
@@ -204,41 +359,48 @@ class TestFileManager(BenchmarkTest):
         v = self.manager.get_tree(parent, False, False)
         self.assert_ordered([pid], pos, pos + 1, v.root.pids, v.packages, True)
 
-    # assert that ordering is total, complete with no gaps
+    # assert that part is at start and the sort keys follow the listed order
     def assert_ordered(self, part, start, end, data, dict, pack=False):
         assert data[start:end] == part
         if pack:
-            assert sorted(pinfo.packageorder for pinfo in dict.values()
-                          ) == list(range(len(dict)))
-            assert [dict[pid].packageorder for pid in part] == list(
-                range(start, end))
+            orders = [dict[pid].packageorder for pid in data]
         else:
-            assert sorted(finfo.fileorder for finfo in dict.values()
-                          ) == list(range(len(dict)))
-            assert [dict[fid].fileorder for fid in part] == list(
-                range(start, end))
+            orders = [dict[fid].fileorder for fid in data]
+        assert len(orders) == len(dict)
+        assert orders == sorted(set(orders))
 
     def test_move(self):
 
         pid = self.pids[-1]
         pid2 = self.pids[1]
 
-        self.manager.move_package(pid, -1)
+        moved = self.manager.move_package(pid, -1)
         v = self.manager.get_tree(-1, False, False)
 
         assert pid in v.root.pids
-        assert sorted(pinfo.packageorder for pinfo in v.packages.values()
-                      ) == list(range(len(v.packages)))
+        # appended behind the other packages
+        if moved:
+            assert list(v.packages.keys())[-1] == pid
+        orders = [pinfo.packageorder for pinfo in v.packages.values()]
+        assert orders == sorted(set(orders))
 
         v = self.manager.get_tree(pid, False, False)
         fids = v.root.fids[10:20]
+        cached = [self.manager.get_file(fid) for fid in fids]
         self.manager.move_files(fids, pid2)
         v = self.manager.get_tree(pid2, False, False)
 
-        assert sorted(finfo.fileorder for finfo in v.files.values()
-                      ) == list(range(len(v.files)))
+        assert v.root.fids[-len(fids):] == fids
+        orders = [v.files[fid].fileorder for fid in v.root.fids]
+        assert orders == sorted(set(orders))
         assert len(v.files) == self.count + len(fids)
 
+        # the cached files get the order of their new package
+        stored = self.db.get_all_files(package=pid2)
+        for file in cached:
+            assert file.packageid == pid2
+            assert file.fileorder == stored[file.fid].fileorder
+
 
 if __name__ == '__main__':
     TestFileManager.benchmark()
@@ -3,13 +3,19 @@
 
 from __future__ import absolute_import, unicode_literals
 
+import os
 import random
+import sqlite3
 from builtins import range
+from queue import Empty
 
 from future import standard_library
+from nose.tools import assert_raises
 
 from pyload.core.database import DatabaseBackend
-from pyload.core.datatype import DownloadState, FileInfo, PackageInfo
+from pyload.core.database.backend import ORDER_GAP, JobQueue
+from pyload.core.datatype import (DownloadState, DownloadStatus, FileInfo,
+                                  PackageInfo)
 from tests.helper.benchmark import BenchmarkTest
 from tests.helper.stubs import Core
 
@@ -35,16 +41,13 @@ class TestDatabase(BenchmarkTest):
         cls.pids = [-1]
         cls.fids = []
 
-        cls.db = DatabaseBackend(Core())
-        cls.db.manager = cls.db.core
-
-        cls.db.setup()
+        cls.db = Core().db
         cls.db.purge_all()
 
     @classmethod
     def tearDownClass(cls):
         cls.db.purge_all()
-        cls.db.shutdown()
+        cls.db.exit()
 
     # benchmarker ignore setup
     def setUp(self):
@@ -74,13 +77,28 @@ class TestDatabase(BenchmarkTest):
             self.db.add_links((("url {0}".format(i), "plugin")
                                for i in range(50)), pid, self.owner)
 
+    def test_insert_bulk(self):
+        pid = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        fid = self.db.add_link("url", "single", "plugin", pid, 0)
+        self.db.add_links((("bulk {0}".format(i), "plugin")
+                           for i in range(100)), pid, 0)
+
+        files = list(self.db.get_all_files(package=pid).values())
+        assert files[0].fid == fid
+        assert len(files) == 101
+        assert all(f.added for f in files)
+        orders = [f.fileorder for f in files]
+        assert orders == sorted(set(orders))
+        assert self.db.get_package_info(pid).stats.linkstotal == 101
+        assert "bulk 42" in self.db.get_matching_filenames("bulk 42")
+
     def test_get_packages(self):
         packs = self.db.get_all_packages()
         n = len(packs)
         assert n == len(self.pids) - 1
 
         print("Fetched {0:d} packages".format(n))
-        self.assert_pack(random.choice(packs.values()))
+        self.assert_pack(random.choice(list(packs.values())))
 
     def test_get_files(self):
         files = self.db.get_all_files()
@@ -88,7 +106,7 @@ class TestDatabase(BenchmarkTest):
         assert n >= len(self.pids)
 
         print("Fetched {0:d} files".format(n))
-        self.assert_file(random.choice(files.values()))
+        self.assert_file(random.choice(list(files.values())))
 
     def test_get_files_queued(self):
         files = self.db.get_all_files(state=DownloadState.Unfinished)
@@ -104,14 +122,28 @@ class TestDatabase(BenchmarkTest):
         packs = self.db.get_all_packages(root=pid)
 
         print("Package {0:d} has {1:d} packages".format(pid, len(packs)))
-        self.assert_pack(random.choice(packs.values()))
+        self.assert_pack(random.choice(list(packs.values())))
+
+    def test_get_subtree(self):
+        self.db.purge_all()
+        p1 = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        p2 = self.db.add_package("name", "folder", p1, "", "", "", 0, 0)
+        p3 = self.db.add_package("name", "folder", p2, "", "", "", 0, 0)
+        other = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        for pid in (p1, p2, p3, other):
+            self.db.add_link("url", "name", "plugin", pid, 0)
+
+        assert set(self.db.get_all_packages(tree=p2)) == {p2, p3}
+        assert set(self.db.get_all_packages(tree=p1)) == {p1, p2, p3}
+        files = self.db.get_all_files(tree=p1)
+        assert set(f.package for f in files.values()) == {p1, p2, p3}
 
     def test_get_package_files(self):
         pid = random.choice(self.pids)
         files = self.db.get_all_files(package=pid)
 
         print("Package {0:d} has {1:d} files".format(pid, len(files)))
-        self.assert_file(random.choice(files.values()))
+        self.assert_file(random.choice(list(files.values())))
 
     def test_get_package_data(self, stats=False):
         pid = random.choice(self.pids)
@@ -121,6 +153,22 @@ class TestDatabase(BenchmarkTest):
         if not stats:
             self.test_get_package_data(True)
 
+    def test_package_stats(self):
+        pid = random.choice(self.pids[1:])
+        files = self.db.get_all_files(package=pid)
+        stats = self.db.get_package_info(pid).stats
+        assert stats.linkstotal == len(files)
+        assert stats.linksdone == 0
+
+        fid = random.choice(list(files.keys()))
+        self.db.set_download_status(fid, DownloadStatus.Finished)
+        assert self.db.get_stats_for_package(pid).linksdone == 1
+
+        self.db.delete_file(fid)
+        stats = self.db.get_stats_for_package(pid)
+        assert stats.linkstotal == len(files) - 1
+        assert stats.linksdone == 0
+
     def test_get_file_data(self):
         fid = random.choice(self.fids)
         finfo = self.db.get_file_info(fid)
@@ -129,13 +177,162 @@ class TestDatabase(BenchmarkTest):
     def test_find_files(self):
         files = self.db.get_all_files(search="1")
         print("Found {0} files".format(len(files)))
-        finfo = random.choice(files.values())
+        finfo = random.choice(list(files.values()))
 
         assert "1" in finfo.name
         names = self.db.get_matching_filenames("1")
         for name in names:
             assert "1" in name
 
+    def test_search_prefix(self):
+        self.db.purge_all()
+        pid = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        fid = self.db.add_link(
+            "url1", "Some.Movie.part1.rar", "plugin", pid, 0)
+        self.db.add_link("url2", "other.zip", "plugin", pid, 0)
+
+        assert self.db.get_matching_filenames("mov par") == [
+            "Some.Movie.part1.rar"]
+        assert list(self.db.get_all_files(search="movie").keys()) == [fid]
+
+        self.db.update_link_info([("renamed.rar", 0, 3, "url1")])
+        assert not self.db.get_matching_filenames("movie")
+
+    def test_pages(self):
+        files = list(self.db.get_all_files().keys())
+        assert [f.fid for f in self.db.iter_files(size=7)] == files
+
+        page = self.db.get_files_page(limit=10)
+        assert [f.fid for f in page] == files[:10]
+        page = self.db.get_files_page(
+            (page[-1].package, page[-1].fileorder), 10)
+        assert [f.fid for f in page] == files[10:20]
+
+        packs = list(self.db.get_all_packages().keys())
+        assert [p.pid for p in self.db.iter_packages(size=3)] == packs
+
+    def test_order_files(self):
+        pid = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        self.db.add_links((("url {0}".format(i), "plugin")
+                           for i in range(20)), pid, 0)
+        fids = list(self.db.get_all_files(package=pid).keys())
+
+        renumbered = False
+        for i in range(200):
+            start = random.randrange(len(fids) - 3)
+            block = fids[start:start + random.randint(1, 3)]
+            # mostly to the front, so the gap there runs out
+            position = random.choice((0, 0, random.randrange(len(fids))))
+            # a block can not end inside itself
+            if start < position < start + len(block) - 1:
+                continue
+            orders = self.db.order_files(pid, block, position)
+            renumbered |= len(orders) > len(block)
+
+            rest = [fid for fid in fids if fid not in block]
+            # moved downwards, the block ends at position
+            if position > start:
+                position -= len(block) - 1
+            fids = rest[:position] + block + rest[position:]
+
+            files = self.db.get_all_files(package=pid)
+            assert list(files.keys()) == fids
+            keys = [f.fileorder for f in files.values()]
+            assert keys == sorted(set(keys))
+            assert keys[0] >= 0
+        assert renumbered
+
+    def test_order_packages(self):
+        root = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        pids = [self.db.add_package("name", "folder", root, "", "", "", 0, 0)
+                for i in range(5)]
+
+        # every move to the front halves the gap in front of the first
+        # package, until the parent is renumbered
+        renumbered = 0
+        for i in range(40):
+            pid = pids.pop()
+            pids.insert(0, pid)
+            orders = self.db.order_package(pid, root, 0)
+            if len(orders) > 1:
+                assert set(orders) == set(pids)
+                renumbered += 1
+            packs = self.db.get_all_packages(root=root)
+            assert [p for p in packs if p != root] == pids
+        assert renumbered >= 2
+
+    def test_move_order(self):
+        pid = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        empty = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        other = self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+        self.db.add_links((("url {0}".format(i), "plugin")
+                           for i in range(3)), pid, 0)
+        fids = list(self.db.get_all_files(package=pid).keys())
+
+        # moved items start at the same base as inserted ones
+        self.db.move_files(pid, fids[:2], empty)
+        files = self.db.get_all_files(package=empty)
+        assert [f.fileorder for f in files.values()] == [0, ORDER_GAP]
+        self.db.move_package(other, empty)
+        assert self.db.get_package_info(other).packageorder == 0
+
+    def test_job_stats(self):
+        self.db.stats.reset()
+        self.db.get_all_files()
+        self.db.get_all_files()
+
+        stats = self.db.get_stats()
+        method = stats["methods"]["get_all_files"]
+        assert method["count"] == 2
+        assert sum(method["exec"]["buckets"]) == 2
+        assert len(method["wait"]["buckets"]) == len(stats["buckets"]) + 1
+
+    def test_job_lanes(self):
+        jobs = JobQueue(2, 60, 2)
+        for i in range(4):
+            jobs.put("bulk {0}".format(i), 1)
+            jobs.put("default {0}".format(i))
+
+        order = [jobs.get_nowait() for _ in range(8)]
+        # bulk jobs run every third job at the latest
+        assert order[:3] == ["default 0", "default 1", "bulk 0"]
+        assert [x for x in order if x.startswith("default")] == [
+            "default {0}".format(i) for i in range(4)]
+        assert_raises(Empty, jobs.get_nowait)
+
+    def test_backup(self):
+        target = os.path.join(self.db.pyload.tmpdir, "backup.db")
+        assert self.db.reserve_backup(target)
+        assert not self.db.reserve_backup(target)
+
+        if hasattr(sqlite3.Connection, "backup"):
+            self.db.backup(target)
+            assert os.path.isfile(target)
+        else:
+            assert_raises(RuntimeError, self.db.backup, target)
+
+        # released after the backup, also when it failed
+        assert self.db.backup_progress is None
+        assert self.db.reserve_backup(target)
+        self.db.release_backup()
+
+    def test_storage(self):
+        self.db.set_storage("test", "key", 1)
+        self.db.set_storage_items("test", {"other": "value", "none": None})
+        assert self.db.get_storage("test") == {"key": "1", "other": "value"}
+
+        # None deletes the entry
+        self.db.set_storage("test", "key", None)
+        assert self.db.get_storage("test", "key") is None
+
+        # written behind, read again from the database
+        self.db.flush_storage()
+        self.db.wait_lane(self.db.DEFAULT)
+        self.db.storage.data.clear()
+        assert self.db.get_storage("test") == {"other": "value"}
+        self.db.del_storage("test", "other")
+        self.db.flush_storage()
+
     def test_collector(self):
         self.db.save_collector(0, "data")
         assert self.db.retrieve_collector(0) == "data"
@@ -196,6 +393,31 @@ class TestDatabase(BenchmarkTest):
         assert self.db.queuestats() == (0, 0)
         assert self.db.processcount() == 0
 
+    def test_owner_stats(self):
+        files = list(self.db.get_all_files().values())
+        for finfo in files[:10]:
+            self.db.set_download_status(finfo.fid, DownloadStatus.Finished)
+        self.db.add_file("name", 100, 0, self.pids[1], self.owner)
+        self.db.add_link("url", "name", "plugin", self.pids[1], 1)
+
+        def count(s):
+            s.c.execute(
+                'SELECT owner, COUNT(*), SUM(dlstatus NOT IN (5,6)) '
+                'FROM files WHERE dlstatus > 0 GROUP BY owner')
+            return dict((r[0], r[1:]) for r in s.c.fetchall())
+
+        counts = self.db.queue(count)
+        for owner, (total, queued) in counts.items():
+            assert self.db.downloadstats(owner)[0] == total
+            assert self.db.queuestats(owner)[0] == queued
+        assert self.db.queuestats()[0] == len(files) - 10 + 1
+        assert self.db.processcount() == len(files) - 10 + 1
+
+        self.db.delete_package(self.pids[1])
+        self.db.reconcile_owner_stats()
+        stats = self.db.get_owner_stats()
+        assert stats[self.owner][0] == self.db.queue(count)[self.owner][0]
+
     def test_update(self):
         p1 = self.db.add_package(
             "name",
@@ -220,6 +442,30 @@ class TestDatabase(BenchmarkTest):
         assert pack.comment == "lol"
         assert "video" in pack.tags
 
+    def test_find_packages(self):
+        self.db.purge_all()
+        pids = [self.db.add_package("name", "folder", -1, "", "", "", 0, 0)
+                for _ in range(3)]
+        for pid, tags in zip(pids, (["video", "hd"], ["video"], ["music"])):
+            pack = self.db.get_package_info(pid)
+            pack.tags = tags
+            self.db.update_package(pack)
+
+        assert list(self.db.find_packages(["video", "hd"]).keys()) == pids[:1]
+        assert list(self.db.find_packages(["video"]).keys()) == pids[:2]
+        assert list(self.db.find_packages(
+            ["hd", "music"], match_all=False).keys()) == [pids[0], pids[2]]
+        assert not self.db.find_packages(["video"], owner=1)
+        assert not self.db.find_packages([])
+
+        pack = self.db.get_package_info(pids[0])
+        pack.tags = ["music"]
+        self.db.update_package(pack)
+        assert not self.db.find_packages(["hd"])
+
+        self.db.delete_package(pids[2])
+        assert list(self.db.find_packages(["music"]).keys()) == pids[:1]
+
     def assert_file(self, finfo):
         try:
             assert finfo is not None
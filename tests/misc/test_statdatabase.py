@@ -2,10 +2,11 @@
 
 from __future__ import absolute_import, unicode_literals
 
-from builtins import object
+from builtins import object, range
 
 from future import standard_library
 
+from pyload.core.database.stat import DAY, HOUR, MINUTE
 from tests.helper.stubs import Core
 
 standard_library.install_aliases()
@@ -19,3 +20,22 @@ class TestStatDatabase(object):
 
     def test_simple(self):
         assert 1 == 0
+
+    def test_statistics(self):
+        db = self.core.db
+        start = 1500000000 // DAY * DAY
+        for i in range(120):
+            db.add_entry(77, "plugin", i % 2, 10, ts=start + i * 60)
+
+        # rolled up into hours and days on write
+        assert db.get_traffic(77, start, start + DAY, HOUR) == [
+            (start, 600, 60), (start + HOUR, 600, 60)]
+        assert db.get_traffic(77, start, start + DAY, DAY) == [
+            (start, 1200, 120)]
+        assert db.get_plugin_traffic(77, start, start + DAY) == [
+            ("plugin", False, 600, 60), ("plugin", True, 600, 60)]
+        assert db.get_traffic_sum(77, start + 90, start + 5430) == 900
+
+        db.purge_stats(now=start + 10 * DAY)
+        assert not db.get_traffic(77, start, start + DAY, MINUTE)
+        assert db.get_traffic_sum(77, start, start + DAY) == 1200